@@ -3,8 +3,7 @@ version = '0.3.0-dev'
 __author__ = 'mac'
 
 
-def run(config):
-    import atexit
+def _monkey_patch():
     import sys
 
     # Reset sys.modules so that g-event can re-monkeypatch.
@@ -19,6 +18,12 @@ def run(config):
 
     patch_all()
 
+
+def run(config):
+    import atexit
+
+    _monkey_patch()
+
     from .jeev import Jeev
     import logging
 
@@ -93,4 +98,21 @@ def modopts(config):
 
             print '     - environ key: %s' % module_instance.opts.environ_key(opt.name)
 
-            print
\ No newline at end of file
+            print
+
+
+def bench(config, corpus_path, repeat=1):
+    _monkey_patch()
+
+    from .jeev import Jeev
+    from .bench import read_corpus, run_bench, print_results
+
+    corpus = read_corpus(corpus_path)
+    j = Jeev(config)
+    j.modules.load_all()
+
+    try:
+        print_results(run_bench(j, corpus, repeat))
+
+    finally:
+        j.modules.unload_all()
@@ -57,7 +57,7 @@ class ConsoleAdapter(object):
         self._reader.kill()
         self._reader = None
 
-    def send_message(self, channel, message):
+    def send_message(self, channel, message, priority=False):
         self._stdout.write('\r< [#%s] %s\n' % (channel, message))
         self._stdout.write('[%s@%s] > ' % (self._user, self._channel))
         self._stdout.flush()
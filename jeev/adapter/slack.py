@@ -1,16 +1,76 @@
-from collections import defaultdict
+import heapq
 import json
 import logging
+import time
 import weakref
-from gevent import Greenlet, sleep
-from slackclient._server import Server
+from gevent import Greenlet, get_hub, sleep, spawn_raw
+from gevent.event import AsyncResult
+from gevent.lock import Semaphore
+from slackclient._server import Server, SlackLoginError
 from websocket._exceptions import WebSocketConnectionClosedException
 
 from jeev.message import Message
 from jeev import events
+from .slack_capture import FrameRecorder
+from .slack_snapshot import DirectorySnapshot
+from .slack_transport import SlackHttpTransport
+from ..utils.backoff import Backoff
+from ..utils.name_index import NameIndex
+from ..utils.periodic import Periodic
+from ..utils.scheduler import RateLimitedScheduler
+
+try:
+    from ujson import loads as _decode_frame
+
+except ImportError:
+    _decode_frame = json.loads
 
 logger = logging.getLogger('jeev.adapter.slack')
 
+# Returned by `SlackObject._set_field` when the field already had the value.
+_UNCHANGED = object()
+
+# Frame types that Jeev has no use for, and that are dropped without being decoded. Typing notifications alone can be
+# most of the frames of a big team.
+IGNORED_FRAME_TYPES = frozenset(['user_typing', 'reconnect_url', 'desktop_notification', 'pref_change',
+                                 'channel_marked', 'group_marked', 'im_marked'])
+_FRAME_TYPE_PREFIX = '{"type":"'
+
+
+def _intern(s):
+    """
+        Interns ids and names, which are repeated all over the team directory (in every channel's member list, for
+        instance). Only byte strings can be interned, so ascii unicode strings are interned as byte strings, which
+        compare and hash the same.
+    """
+    if isinstance(s, unicode):
+        try:
+            s = s.encode('ascii')
+        except UnicodeEncodeError:
+            return s
+
+    if isinstance(s, str):
+        return intern(s)
+
+    return s
+
+
+class _ReadOnlyDict(dict):
+    """
+        A dict that can't be changed, for the copies of the directory objects' data handed out to modules, so that
+        changing them fails loudly, instead of silently not changing the object.
+    """
+    __slots__ = []
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("%s is read-only" % type(self).__name__)
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        # Copies (and pickles) are plain dicts, that can be changed.
+        return dict, (dict(self),)
+
 
 class SlackAdapter(object):
     """
@@ -22,96 +82,245 @@ class SlackAdapter(object):
         use Hubot, and point it to the the adapter's listen host and port.
     """
 
+    # How many directory objects are built from the login data between yields to the hub.
+    login_batch_size = 500
+
+    # How many ids that don't exist are remembered at most (see `_is_missing`).
+    max_missing_ids = 10000
+
     class SlackObject(object):
+        """
+            A user, channel, group or DM in the team directory. Only the fields that Jeev reads are kept, the hot ones
+            in slots and the rest in `_fields`, with ids and names interned, since big teams have tens of thousands of
+            these.
+        """
+        __slots__ = ['id', 'name', '_fields', '_linked_names']
+
+        # The fields of the slack object's data that are kept, the others are dropped to save memory. Slack sends a lot
+        # of fields that Jeev never reads, which add up on big teams. None keeps every field.
+        keep_fields = None
+
+        # The fields the object is indexed by (see `SlackObjectList`), it has to be re-added to its list when they
+        # change.
+        indexed_fields = frozenset(['name'])
+
         def __init__(self, data):
-            self.data = data
-            self._in_name_sets = set()
+            self.id = None
+            self.name = None
+            self._fields = {}
+            self._linked_names = None
+            self._update(**data)
 
         @property
-        def id(self):
-            return self.data['id']
+        def data(self):
+            """
+                The object's data, as it would be sent by slack (minus the fields that weren't kept). This is a
+                read-only copy, the object can't be changed through it.
+            """
+            return _ReadOnlyDict(self._data())
 
-        @property
-        def name(self):
-            return self.data['name']
+        def _data(self):
+            data = dict(self._fields, id=self.id)
+            if self.name is not None:
+                data['name'] = self.name
+
+            return data
 
-        def _iter_name_sets(self):
-            pass
+        def _aliases(self):
+            """
+                The names, other than `name`, that the object can be found by.
+            """
+            return ()
 
-        def _link(self, name):
-            self._in_name_sets.add(name)
+        def _link(self, name, aliases):
+            self._linked_names = name, aliases
 
         def _unlink(self):
-            self._in_name_sets.clear()
+            self._linked_names = None
 
         def iter_names(self):
-            return iter(self._in_name_sets)
+            if self._linked_names is not None:
+                name, aliases = self._linked_names
+                yield name
+                for alias in aliases:
+                    yield alias
 
         def _update(self, **kwargs):
+            """
+                Updates the object's fields, and returns the previous values of the fields that changed.
+            """
+            changed = {}
+            keep_fields = self.keep_fields
             for k, v in kwargs.iteritems():
-                if k == 'ok':
+                if k == 'ok' or (keep_fields is not None and k not in keep_fields):
                     continue
 
-                self.data[k] = v
+                previous = self._set_field(k, v)
+                if previous is not _UNCHANGED:
+                    changed[k] = previous
+
+            return changed
+
+        def _set_field(self, k, v):
+            if k == 'id' or k == 'name':
+                return self._set_slot(k, _intern(v))
+
+            if k in self._fields and self._fields[k] == v:
+                return _UNCHANGED
+
+            previous = self._fields.get(k)
+            self._fields[k] = v
+            return previous
+
+        def _set_slot(self, attr, v):
+            previous = getattr(self, attr)
+            if previous == v:
+                return _UNCHANGED
+
+            setattr(self, attr, v)
+            return previous
 
         def __str__(self):
-            return self.name
+            return self.name or self.id
 
     class SlackUser(SlackObject):
+        __slots__ = ['presence', 'display_name']
+
+        keep_fields = frozenset(['id', 'name', 'deleted', 'presence', 'real_name', 'tz', 'tz_offset', 'is_admin',
+                                 'is_owner', 'is_bot', 'profile'])
+        keep_profile_fields = frozenset(['real_name', 'display_name', 'first_name', 'last_name', 'email', 'title',
+                                         'bot_id'])
+        indexed_fields = frozenset(['name', 'real_name', 'profile'])
+
+        def __init__(self, data):
+            self.presence = None
+            self.display_name = None
+            super(SlackAdapter.SlackUser, self).__init__(data)
+
+        def _data(self):
+            data = super(SlackAdapter.SlackUser, self)._data()
+            if self.presence is not None:
+                data['presence'] = self.presence
+
+            if 'profile' in data:
+                data['profile'] = self.profile
+
+            return data
+
         @property
-        def presence(self):
-            return self.data['presence']
+        def profile(self):
+            """
+                The user's profile, which is kept encoded until it's asked for. This is a read-only copy, the profile
+                can't be changed through it.
+            """
+            profile = self._fields.get('profile')
+            if profile is not None:
+                return _ReadOnlyDict(json.loads(profile))
+
+        def _set_field(self, k, v):
+            if k == 'presence':
+                return self._set_slot('presence', _intern(v))
+
+            if k == 'profile':
+                # The display name is kept decoded, since users are looked up by it. The keys are sorted, so that the
+                # same profile always encodes to the same string, and isn't mistaken for a change.
+                self.display_name = v.get('display_name') or None
+                v = json.dumps({pk: pv for pk, pv in v.iteritems() if pk in self.keep_profile_fields},
+                               separators=(',', ':'), sort_keys=True)
+
+            return super(SlackAdapter.SlackUser, self)._set_field(k, v)
+
+        def _aliases(self):
+            aliases = set()
+            for alias in self.display_name, self._fields.get('real_name'):
+                if alias and alias != self.name:
+                    aliases.add(alias)
+
+            return tuple(aliases)
 
         def __repr__(self):
             return '<SlackUser id=%r, name=%r, presence=%s>' % (self.id, self.name, self.presence)
 
     class _SlackChannelBase(SlackObject):
+        __slots__ = ['_adapter']
         is_direct_message = False
 
         def __init__(self, data, adapter):
-            super(SlackAdapter._SlackChannelBase, self).__init__(data)
             self._adapter = adapter
+            super(SlackAdapter._SlackChannelBase, self).__init__(data)
 
         @property
         def topic(self):
-            if 'topic' in self.data:
-                return self.data['topic']['value']
+            if 'topic' in self._fields:
+                return self._fields['topic']['value']
 
         @topic.setter
         def topic(self, val):
-            if val != self.data['topic']:
+            if val != self.topic:
                 self._adapter.api.channels.setTopic(channel=self, topic=val)
 
         @property
         def purpose(self):
-            if 'purpose' in self.data:
-                return self.data['purpose']['value']
+            if 'purpose' in self._fields:
+                return self._fields['purpose']['value']
 
         @purpose.setter
         def purpose(self, val):
             raise NotImplementedError("Bots cannot set channel purpose.")
 
     class SlackChannel(_SlackChannelBase):
+        __slots__ = ['member_ids', '_members']
+
+        keep_fields = frozenset(['id', 'name', 'created', 'creator', 'is_archived', 'is_general', 'is_channel',
+                                 'is_member', 'members', 'topic', 'purpose'])
+
+        def __init__(self, data, adapter):
+            self.member_ids = frozenset()
+            self._members = None
+            super(SlackAdapter.SlackChannel, self).__init__(data, adapter)
+
+        def _data(self):
+            return dict(super(SlackAdapter.SlackChannel, self)._data(), members=list(self.member_ids))
+
         @property
         def members(self):
-            members = []
-            for m in self.data['members']:
-                members.append(self._adapter._users[m])
+            """
+                A tuple of the members, which is cached until the members change. Members that aren't known users
+                (yet) are left out.
+            """
+            if self._members is None:
+                users = self._adapter._users
+                self._members = tuple(users[m] for m in self.member_ids if m in users)
+
+            return self._members
+
+        def has_member(self, user):
+            return getattr(user, 'id', user) in self.member_ids
+
+        def _set_field(self, k, v):
+            if k == 'members':
+                return self._set_members(frozenset(_intern(m) for m in v))
 
-            return members
+            return super(SlackAdapter.SlackChannel, self)._set_field(k, v)
+
+        def _set_members(self, member_ids):
+            previous = self._set_slot('member_ids', member_ids)
+            if previous is not _UNCHANGED:
+                self._members = None
+                self._adapter._update_memberships(self, previous, member_ids)
+
+            return previous
 
         def _left(self, archive=False):
-            keep_keys = 'created', 'creator', 'id', 'is_archived', 'is_channel', 'is_general'
-            for k in self.data.keys():
+            keep_keys = 'created', 'creator', 'is_archived', 'is_channel', 'is_general'
+            for k in self._fields.keys():
                 if k not in keep_keys:
-                    del self.data[k]
+                    del self._fields[k]
 
-            self.data.update(
-                members=[],
-                is_member=False
-            )
+            self._set_members(frozenset())
+            self._fields['is_member'] = False
             if archive:
-                self.data['is_archived'] = True
+                self._fields['is_archived'] = True
 
         def __repr__(self):
             return "<SlackChannel id=%r, name=%r, members=%r>" % (
@@ -119,52 +328,85 @@ class SlackAdapter(object):
             )
 
     class _SlackGroupBase(SlackObject):
+        __slots__ = ['_adapter']
         is_direct_message = False
 
         def __init__(self, data, adapter):
-            super(SlackAdapter._SlackGroupBase, self).__init__(data)
             self._adapter = adapter
+            super(SlackAdapter._SlackGroupBase, self).__init__(data)
 
         @property
         def topic(self):
-            if 'topic' in self.data:
-                return self.data['topic']['value']
+            if 'topic' in self._fields:
+                return self._fields['topic']['value']
 
         @topic.setter
         def topic(self, val):
-            if val != self.data['topic']:
+            if val != self.topic:
                 self._adapter.api.groups.setTopic(channel=self, topic=val)
 
         @property
         def purpose(self):
-            if 'purpose' in self.data:
-                return self.data['purpose']['value']
+            if 'purpose' in self._fields:
+                return self._fields['purpose']['value']
 
         @purpose.setter
         def purpose(self, val):
             raise NotImplementedError("Bots cannot set group purpose.")
 
     class SlackGroup(_SlackGroupBase):
+        __slots__ = ['member_ids', '_members']
+
+        keep_fields = frozenset(['id', 'name', 'created', 'creator', 'is_archived', 'is_group', 'is_open', 'members',
+                                 'topic', 'purpose'])
+
+        def __init__(self, data, adapter):
+            self.member_ids = frozenset()
+            self._members = None
+            super(SlackAdapter.SlackGroup, self).__init__(data, adapter)
+
+        def _data(self):
+            return dict(super(SlackAdapter.SlackGroup, self)._data(), members=list(self.member_ids))
+
         @property
         def members(self):
-            members = []
-            for m in self.data['members']:
-                members.append(self._adapter._users[m])
+            """
+                A tuple of the members, which is cached until the members change. Members that aren't known users
+                (yet) are left out.
+            """
+            if self._members is None:
+                users = self._adapter._users
+                self._members = tuple(users[m] for m in self.member_ids if m in users)
+
+            return self._members
+
+        def has_member(self, user):
+            return getattr(user, 'id', user) in self.member_ids
+
+        def _set_field(self, k, v):
+            if k == 'members':
+                return self._set_members(frozenset(_intern(m) for m in v))
+
+            return super(SlackAdapter.SlackGroup, self)._set_field(k, v)
+
+        def _set_members(self, member_ids):
+            previous = self._set_slot('member_ids', member_ids)
+            if previous is not _UNCHANGED:
+                self._members = None
+                self._adapter._update_memberships(self, previous, member_ids)
 
-            return members
+            return previous
 
         def _left(self, archive=False):
-            keep_keys = 'created', 'creator', 'id', 'is_archived', 'is_group', 'is_general'
-            for k in self.data.keys():
+            keep_keys = 'created', 'creator', 'is_archived', 'is_group', 'is_general'
+            for k in self._fields.keys():
                 if k not in keep_keys:
-                    del self.data[k]
+                    del self._fields[k]
 
-            self.data.update(
-                members=[],
-                is_member=False
-            )
+            self._set_members(frozenset())
+            self._fields['is_member'] = False
             if archive:
-                self.data['is_archived'] = True
+                self._fields['is_archived'] = True
 
         def __repr__(self):
             return "<SlackGroup id=%r, name=%r, members=%r>" % (
@@ -172,43 +414,81 @@ class SlackAdapter(object):
             )
 
     class SlackDirectMessage(_SlackChannelBase):
+        __slots__ = ['user_id']
+
         is_direct_message = True
+        keep_fields = frozenset(['id', 'user', 'created', 'is_im', 'is_open', 'is_user_deleted'])
+
+        def __init__(self, data, adapter):
+            self.user_id = None
+            super(SlackAdapter.SlackDirectMessage, self).__init__(data, adapter)
+            # Slack doesn't name DMs, so they're named by their id, like slackclient used to do.
+            if self.name is None:
+                self.name = self.id
+
+        def _data(self):
+            return dict(super(SlackAdapter.SlackDirectMessage, self)._data(), user=self.user_id)
 
         @property
         def user(self):
-            return self._adapter._users[self.data['user']]
+            return self._adapter._users[self.user_id]
 
         @property
         def members(self):
             return [self.user]
 
+        def has_member(self, user):
+            return getattr(user, 'id', user) == self.user_id
+
+        def _set_field(self, k, v):
+            if k == 'user':
+                return self._set_slot('user_id', _intern(v))
+
+            return super(SlackAdapter.SlackDirectMessage, self)._set_field(k, v)
+
         def __repr__(self):
             return '<SlackDirectMessage id=%r, name=%r, user=%r>' % (
                 self.id, self.name, self.user
             )
 
     class SlackObjectList(object):
+        """
+            The users, channels, groups or DMs of the team, indexed by id, and case-insensitively by name and by alias
+            (display name and real name, for users). Names can be looked up by prefix.
+        """
+
         def __init__(self):
             self._obj_by_id = {}
-            self._obj_by_name = defaultdict(set)
+            self._obj_by_name = NameIndex()
+            self._obj_by_alias = NameIndex()
 
         def clear(self):
             self._obj_by_id.clear()
             self._obj_by_name.clear()
+            self._obj_by_alias.clear()
 
         def add(self, obj):
             if obj in self:
                 self.remove(obj)
 
             self._obj_by_id[obj.id] = obj
-            name = obj.name.lower()
-            obj._link(name)
-            self._obj_by_name[obj.name.lower()].add(obj)
+            if obj.name is None:
+                # DMs don't have names.
+                return
+
+            aliases = obj._aliases()
+            obj._link(obj.name, aliases)
+            self._obj_by_name.add(obj.name, obj)
+            for alias in aliases:
+                self._obj_by_alias.add(alias, obj)
 
         def remove(self, obj):
             self._obj_by_id.pop(obj.id)
-            for name in obj.iter_names():
-                self._obj_by_name[name].discard(obj)
+            if obj._linked_names is not None:
+                name, aliases = obj._linked_names
+                self._obj_by_name.discard(name, obj)
+                for alias in aliases:
+                    self._obj_by_alias.discard(alias, obj)
 
             obj._unlink()
 
@@ -225,6 +505,15 @@ class SlackAdapter(object):
 
             raise KeyError(key)
 
+        def get(self, key, default=None):
+            return self._obj_by_id.get(key, default)
+
+        def __iter__(self):
+            return self._obj_by_id.itervalues()
+
+        def __len__(self):
+            return len(self._obj_by_id)
+
         def __delitem__(self, key):
             if key in self._obj_by_id:
                 obj = self._obj_by_id[key]
@@ -233,15 +522,38 @@ class SlackAdapter(object):
                 raise KeyError(key)
 
         def find(self, name_or_id):
+            """
+                Finds an object by id, by name, or failing that, by alias.
+            """
             if name_or_id in self:
                 return self[name_or_id]
 
-            name_or_id = name_or_id.lower()
-            if name_or_id in self._obj_by_name:
-                return next(iter(self._obj_by_name[name_or_id]), None)
+            return self._obj_by_name.get(name_or_id) or self._obj_by_alias.get(name_or_id)
+
+        def find_prefix(self, prefix, limit=None):
+            """
+                Returns the objects with a name or an alias that starts with `prefix` (case-insensitively), ordered by
+                the name or alias that matched, returning at most `limit` objects.
+
+                    >>> adapter._users.find_prefix('jo', limit=5)
+            """
+            found = []
+            seen = set()
+            matches = heapq.merge(self._obj_by_name.iter_prefix(prefix), self._obj_by_alias.iter_prefix(prefix))
+            for name, objects in matches:
+                for obj in sorted(objects, key=lambda o: o.id):
+                    if obj.id in seen:
+                        continue
+
+                    seen.add(obj.id)
+                    found.append(obj)
+                    if len(found) == limit:
+                        return found
+
+            return found
 
         def names(self):
-            return [k for k, v in self._obj_by_name.iteritems() if v]
+            return self._obj_by_name.names()
 
     class SlackApi(object):
         def __init__(self, adapter=None, parent=None, part=None):
@@ -266,12 +578,47 @@ class SlackAdapter(object):
 
             method = '.'.join(self._parts) or '?'
             logger.debug('Making API call %r with args %r', method, kwargs)
-            result = json.loads(self._adapter._server.api_call(method, **kwargs))
+            result = self._adapter._transport.call(method, kwargs)
             logger.debug('Got response %r', result)
             result = self._adapter._process_post_method_hooks(method, kwargs, result)
             return result
 
+        def async_(self, **kwargs):
+            """
+                Makes the API call in the background, returning an `AsyncResult` that will hold its response. At most
+                `api_pool_size` calls are made at once, the others wait for their turn.
+            """
+            result = AsyncResult()
+            spawn_raw(self._call_async, result, kwargs)
+            return result
+
+        def _call_async(self, result, kwargs):
+            with self._adapter._api_semaphore:
+                try:
+                    result.set(self(**kwargs))
+                except Exception, e:
+                    result.set_exception(e)
+
+        def map(self, calls):
+            """
+                Makes the API call once for every dict of arguments in `calls`, concurrently, and returns the
+                responses in the same order. Raises the error of the first call that failed, if any did.
+
+                    >>> responses = adapter.api.users.info.map([{'user': id} for id in user_ids])
+            """
+            results = [self.async_(**kwargs) for kwargs in calls]
+            return [result.get() for result in results]
+
     class MutableOutgoingMessage(object):
+        """
+            A message that was sent, and that can be edited with `update`.
+
+            Updates are coalesced: they are sent by a single greenlet, at most once per `update_debounce` seconds, and
+            only the latest text is sent. The final text is always sent: an update that fails is retried with backoff,
+            up to `max_update_attempts` times in a row.
+        """
+        max_update_attempts = 5
+
         def __init__(self, adapter, channel, message):
             self.channel = channel
             self.adapter = adapter
@@ -279,26 +626,63 @@ class SlackAdapter(object):
             self.message = message
             self.needs_update = False
             self.ts = None
+            self._updater = None
+            self._last_update_at = 0
 
         def _recv_reply(self, data):
             self.ts = data['ts']
             if self.needs_update:
-                self._do_update()
+                self._schedule_update()
+
+        def _schedule_update(self):
+            if self._updater is None:
+                self._updater = Greenlet(self._run_updates)
+                self._updater.start()
+
+        def _run_updates(self):
+            backoff = Backoff(max_delay=30)
+            try:
+                while self.needs_update:
+                    delay = self._last_update_at + self.adapter._update_debounce - time.time()
+                    if delay > 0:
+                        sleep(delay)
+
+                    try:
+                        self._do_update()
+                        backoff.reset()
+
+                    except Exception:
+                        if backoff.attempts + 1 >= self.max_update_attempts:
+                            logger.exception("Giving up on updating message %r", self)
+                            continue
+
+                        # The text that failed to go out is sent again (unless it's been updated since).
+                        logger.exception("Error updating message %r, retrying", self)
+                        self.needs_update = True
+                        sleep(backoff.next())
+
+            finally:
+                self._updater = None
 
         def _do_update(self):
+            # Cleared before the call, so that updates made while it's in flight are sent after it.
+            self.needs_update = False
+            self._last_update_at = time.time()
+            self.adapter._jeev.metrics.incr('slack_message_updates_total')
             self.adapter.api.chat.update(
                 ts=self.ts,
                 channel=self.channel.id,
                 text=self.message
             )
-            self.needs_update = False
 
         def update(self, message):
             self.message = message
+            if self.needs_update:
+                self.adapter._jeev.metrics.incr('slack_message_updates_coalesced_total')
+
+            self.needs_update = True
             if self.ts:
-                self._do_update()
-            else:
-                self.needs_update = True
+                self._schedule_update()
 
         def serialize(self):
             return {
@@ -325,43 +709,238 @@ class SlackAdapter(object):
         self._outgoing_messages = {}
         self._last_id = 1
         self.api = self.SlackApi(self)
+        api_pool_size = int(opts.get('api_pool_size', 10))
+        self._transport = SlackHttpTransport(self, opts.get('slack_token'), api_pool_size,
+                                             float(opts.get('api_timeout', 10)))
+        self._api_semaphore = Semaphore(api_pool_size)
+        self._recorder = FrameRecorder(opts['capture_path']) if opts.get('capture_path') else None
+        self._ping_interval = float(opts.get('ping_interval', 30))
+        self._ping_timeout = float(opts.get('ping_timeout', 10))
+        self._backoff = Backoff(max_delay=float(opts.get('reconnect_backoff_max', 60)))
+        self._keepalive = None
+        self._last_frame_at = None
+        self._pings = {}
+        self._directory_loaded = False
+        self._directory_stale = False
+        self._reconciler = None
+        self._snapshot = DirectorySnapshot(opts['snapshot_path']) if opts.get('snapshot_path') else None
+        self._snapshot_periodic = Periodic(int(opts.get('snapshot_interval', 600)),
+                                           self._save_snapshot) if self._snapshot else None
+        # Held while saving the snapshot, so that a periodic save and the save on stop never write the same temporary
+        # file at once.
+        self._snapshot_lock = Semaphore()
+        self.latency = None
+        self._update_debounce = float(opts.get('update_debounce', 1))
+        self._ignored_frame_types = IGNORED_FRAME_TYPES.union(
+            t.strip() for t in opts.get('ignore_frame_types', '').split(',') if t.strip())
+        self._frame_handlers = self._build_frame_handlers()
+        self._presence_window = float(opts.get('presence_batch_window', 0.5))
+        self._pending_presences = {}
+        self._presence_flusher = None
+        self._in_flight = {}
+        self._channels_by_user = {}
+        self._missing_ids = {}
+        self._missing_id_ttl = float(opts.get('missing_id_ttl', 30))
+
+        # Slack allows about one message per second per channel, with short bursts.
+        send_rate = float(opts.get('send_rate', 1))
+        self._scheduler = RateLimitedScheduler(self._send_to_websocket, send_rate, int(opts.get('send_burst', 3)),
+                                               on_sent=self._on_message_sent) if send_rate else None
+        if self._scheduler:
+            # Messages are only sent while connected, see `_do_slack_connection`.
+            self._scheduler.pause()
 
     def start(self):
         if self._greenlet:
             raise RuntimeError("SlackAdapter Already Started.")
+        if self._recorder:
+            self._recorder.start()
+        if self._scheduler:
+            self._scheduler.start()
+        if self._snapshot:
+            self._load_snapshot()
+            self._snapshot_periodic.start(right_away=False)
         self._greenlet = Greenlet(self._run)
         self._greenlet.start()
 
     def stop(self):
         self._greenlet.kill()
+        if self._presence_flusher:
+            self._presence_flusher.kill()
+        if self._reconciler:
+            self._reconciler.kill()
+        if self._scheduler:
+            self._scheduler.stop()
+        if self._recorder:
+            self._recorder.stop()
+        if self._snapshot:
+            self._snapshot_periodic.stop()
+            self._save_snapshot()
+        self._transport.close()
 
     def _run(self):
         while True:
-            self._do_slack_connection()
-            sleep(10)
+            try:
+                self._do_slack_connection()
+
+            except WebSocketConnectionClosedException:
+                logger.error('WebSocket connection closed.')
+
+            except Exception:
+                logger.exception('Slack connection failed.')
+
+            delay = self._backoff.next()
+            logger.info('Reconnecting to slack in %.2f seconds', delay)
+            self._jeev.metrics.incr('slack_reconnects_total')
+            sleep(delay)
+
+    def _rtm_call(self, method, **kwargs):
+        login_data = self._transport.call(method, kwargs)
+        if not login_data['ok']:
+            raise SlackLoginError(login_data.get('error'))
+
+        return login_data
 
     def _do_slack_connection(self):
-        if self._server:
+        if self._server and self._server.websocket:
             self._server.websocket.abort()
 
         self._server = Server(self._opts['slack_token'], False)
-        self._server.rtm_connect()
-        self._parse_login_data(self._server.login_data)
-        self._server.websocket.sock.setblocking(1)
-        self.api.im.close(channel='D038BM8HQ')
-
-        while True:
+        self._pings.clear()
+
+        # The replies to the messages sent over the previous connection are never coming, but the messages still
+        # waiting in the scheduler are sent over the new connection, and still need their replies.
+        queued_ids = set(data.get('id') for data in self._scheduler.iter_items()) if self._scheduler else ()
+        for message_id in self._outgoing_messages.keys():
+            if message_id not in queued_ids:
+                del self._outgoing_messages[message_id]
+
+        # When we already have the team directory from a previous connection, rtm.connect gets us a websocket url
+        # without the (potentially huge) directory payload of rtm.start. The directory is kept up to date by the
+        # frames, and by refreshing it when we see ids we don't know about.
+        login_data = None
+        if self._directory_loaded:
             try:
+                login_data = self._rtm_call('rtm.connect')
+                logger.info('Resuming slack connection with the cached team directory')
+            except SlackLoginError:
+                logger.warning('rtm.connect failed, falling back to rtm.start')
+
+        if login_data is None:
+            # Unread counts and the latest message of every channel are never read, and make up a good part of the
+            # payload on big teams.
+            login_data = self._rtm_call('rtm.start', no_unreads=1, no_latest=1)
+            if self._recorder:
+                self._recorder.record_login(login_data)
+            self._parse_login_data(login_data)
+            self._directory_loaded = True
+            self._directory_stale = False
+
+        elif self._directory_stale:
+            # The directory came from a snapshot, so it's brought up to date in the background, while we're already
+            # handling messages with it. A reconnect while the reconcile is still running doesn't start another one.
+            if self._reconciler is None or self._reconciler.ready():
+                self._reconciler = Greenlet(self._reconcile_directory)
+                self._reconciler.start()
+
+        # Don't hold on to the login data (and its directory) for as long as we're connected.
+        url = login_data['url']
+        del login_data
+
+        self._server.connect_slack_websocket(url)
+        self._server.websocket.sock.setblocking(1)
+        self._last_frame_at = time.time()
+        self._keepalive = Greenlet(self._do_keepalive, self._server.websocket)
+        self._keepalive.start()
+        if self._scheduler:
+            self._scheduler.resume()
+
+        try:
+            while True:
                 frame = self._server.websocket.recv()
+                self._last_frame_at = time.time()
                 self._handle_frame(frame)
-            except WebSocketConnectionClosedException:
-                logger.error('WebSocket connection closed.')
-                self._server.rtm_connect(reconnect=True)
-                logger.info('Restarted WebSocket connection')
+
+        finally:
+            # Until we're connected again, outgoing messages wait in the scheduler, instead of failing to be sent.
+            if self._scheduler:
+                self._scheduler.pause()
+            self._keepalive.kill(block=False)
+            self._keepalive = None
+
+    def _do_keepalive(self, websocket):
+        """
+            Pings slack when the connection has been quiet for ping_interval seconds, and aborts the connection if
+            nothing (not even the pong) was received ping_timeout seconds after that.
+        """
+        while True:
+            sleep(min(self._ping_interval, self._ping_timeout) / 2)
+            quiet_for = time.time() - self._last_frame_at
+
+            if quiet_for > self._ping_interval + self._ping_timeout:
+                logger.error('No frames received from slack for %.2f seconds, the connection is dead.', quiet_for)
+                self._jeev.metrics.incr('slack_dead_connections_total')
+                websocket.abort()
+                return
+
+            # A ping whose pong hasn't come back after ping_timeout seconds is given up on, otherwise one lost pong
+            # would stop the pinging for good, and the connection would be aborted as soon as it went quiet.
+            now = time.time()
+            for ping_id, sent_at in self._pings.items():
+                if now - sent_at > self._ping_timeout:
+                    del self._pings[ping_id]
+                    self._jeev.metrics.incr('slack_lost_pongs_total')
+
+            if quiet_for > self._ping_interval and not self._pings:
+                self._ping()
+
+    def _ping(self):
+        ping_id = self._generate_message_id()
+        self._pings[ping_id] = time.time()
+        self._send_to_websocket({'type': 'ping', 'id': ping_id})
+
+    def _handle_pong(self, data):
+        sent_at = self._pings.pop(data.get('reply_to'), None)
+        if sent_at is not None:
+            self.latency = time.time() - sent_at
+            self._jeev.metrics.histogram('slack_ping_seconds').observe(self.latency)
+
+    def _handle_hello(self, data):
+        # The connection is healthy, so the next disconnect can reconnect right away.
+        self._backoff.reset()
+
+    def _build_frame_handlers(self):
+        """
+            Maps every frame type to its `_handle_<type>` method, so that frames don't have to look their handler up.
+        """
+        handlers = {}
+        for attr in dir(self):
+            if attr.startswith('_handle_') and attr != '_handle_frame':
+                handlers[attr[len('_handle_'):]] = getattr(self, attr)
+
+        return handlers
+
+    def _sniff_frame_type(self, frame):
+        """
+            Returns the type of the frame without decoding it, if slack put the type first (which it does for events).
+        """
+        if frame.startswith(_FRAME_TYPE_PREFIX):
+            end = frame.find('"', len(_FRAME_TYPE_PREFIX))
+            if end != -1:
+                return frame[len(_FRAME_TYPE_PREFIX):end]
 
     def _handle_frame(self, frame):
-        data = json.loads(frame)
+        if self._recorder:
+            self._recorder.record_frame(frame)
+
+        frame_type = self._sniff_frame_type(frame)
+        if frame_type in self._ignored_frame_types:
+            self._jeev.metrics.incr('slack_frames_ignored_total', type=frame_type)
+            return
+
+        data = _decode_frame(frame)
         logger.debug("Got frame %r", frame)
+        self._jeev.metrics.incr('slack_frames_total', type=data.get('type', 'unknown'))
 
         if 'reply_to' in data:
             message = self._outgoing_messages.pop(data['reply_to'], None)
@@ -372,7 +951,7 @@ class SlackAdapter(object):
         if 'type' not in data:
             return
 
-        handler = getattr(self, '_handle_%s' % data['type'], None)
+        handler = self._frame_handlers.get(data['type'])
         if handler:
             return handler(data)
 
@@ -395,12 +974,64 @@ class SlackAdapter(object):
         self._broadcast_event(events.User.Changed, user=user)
 
     def _handle_presence_change(self, data):
-        # For reasons that aren't clear, slack does a presence change notification before telling jeev about a new user
-        user = self._get_user(data['user'])
-        if user is None:
+        # Presence changes come in storms on big teams, so they're collected here, and applied in bulk (only the latest
+        # presence of each user) by `_flush_presences`, every `presence_batch_window` seconds.
+        for user_id in data.get('users') or [data['user']]:
+            self._pending_presences[user_id] = data['presence']
+
+        if self._presence_flusher is None:
+            self._presence_flusher = Greenlet(self._flush_presences)
+            self._presence_flusher.start_later(self._presence_window)
+
+    def _flush_presences(self):
+        # Only one flush runs at a time. Presences that come in while a flush is looking up unknown users are left
+        # pending until it's done, and flushed after another window, so that they're never overwritten by the older
+        # presences of the flush in progress.
+        try:
+            self._apply_presences()
+
+        finally:
+            self._presence_flusher = None
+
+        if self._pending_presences:
+            self._presence_flusher = Greenlet(self._flush_presences)
+            self._presence_flusher.start_later(self._presence_window)
+
+    def _apply_presences(self):
+        pending, self._pending_presences = self._pending_presences, {}
+        self._jeev.metrics.histogram('slack_presence_batch_size', buckets=(1, 10, 100, 1000, 10000)).observe(
+            len(pending))
+
+        # For reasons that aren't clear, slack does a presence change notification before telling jeev about a new
+        # user. Those users are looked up all at once.
+        unknown = [user_id for user_id in pending if user_id not in self._users]
+        if unknown:
+            self._load_users(unknown)
+
+        for i, (user_id, presence) in enumerate(pending.iteritems(), 1):
+            if user_id not in self._users:
+                continue
+
+            user = self._users[user_id]
+            if user.presence != presence:
+                user._update(presence=presence)
+                self._broadcast_event(events.User.PresenceChanged, user=user)
+
+            if i % self.login_batch_size == 0:
+                sleep(0)
+
+    def _load_users(self, user_ids):
+        try:
+            responses = self.api.users.info.map([{'user': user_id} for user_id in user_ids])
+
+        except Exception:
+            logger.exception('Could not look up users %r', user_ids)
             return
-        user._update(presence=data['presence'])
-        self._broadcast_event(events.User.PresenceChanged, user=user)
+
+        # The users may have been added while they were being looked up, so they're merged into the directory.
+        for response in responses:
+            if response['ok']:
+                self._merge_object(self._users, self.SlackUser, response['user'])
 
     def _handle_channel_created(self, data):
         channel = data['channel'].copy()
@@ -436,6 +1067,48 @@ class SlackAdapter(object):
         channel._update(is_archived=False)
         self._broadcast_event(events.Channel.UnArchived, channel=channel)
 
+    def _handle_member_joined_channel(self, data):
+        self._apply_membership_change(data, joined=True)
+
+    def _handle_member_left_channel(self, data):
+        self._apply_membership_change(data, joined=False)
+
+    def _apply_membership_change(self, data, joined):
+        channel = self._channels.get(data['channel']) or self._groups.get(data['channel'])
+        if channel is None:
+            return
+
+        user_id = _intern(data['user'])
+        if joined == channel.has_member(user_id):
+            return
+
+        # A user can join a channel before jeev hears about them, so they're looked up first. If they can't be, the
+        # membership is still recorded, and the event is broadcast without a user.
+        user = self._get_user(user_id)
+        channel._set_members(channel.member_ids | {user_id} if joined else channel.member_ids - {user_id})
+        category = events.Group if isinstance(channel, self.SlackGroup) else events.Channel
+        self._broadcast_event(category.UserJoined if joined else category.UserLeft, channel=channel, user=user)
+
+    def _update_memberships(self, channel, before, after):
+        """
+            Keeps the user -> channels index up to date, as the members of a channel or group change.
+        """
+        for user_id in after - before:
+            self._channels_by_user.setdefault(user_id, set()).add(channel)
+
+        for user_id in before - after:
+            channels = self._channels_by_user.get(user_id)
+            if channels is not None:
+                channels.discard(channel)
+                if not channels:
+                    del self._channels_by_user[user_id]
+
+    def user_channels(self, user):
+        """
+            Returns the channels and groups that the user (or user id) is a member of.
+        """
+        return set(self._channels_by_user.get(getattr(user, 'id', user), ()))
+
     def _handle_channel_joined(self, data):
         channel_id = data['channel']['id']
         if channel_id in self._channels:
@@ -449,31 +1122,184 @@ class SlackAdapter(object):
 
         self._broadcast_event(events.Channel.Joined, channel=channel)
 
-    def _process_team_join(self, data):
-        user = self.SlackUser(data['user'])
-        self._users.add(user)
+    def _handle_team_join(self, data):
+        # The user may already be known, from a lookup of an id seen before the team_join frame.
+        user = self._merge_object(self._users, self.SlackUser, data['user'])
         self._broadcast_event(events.Team.Joined, user=user)
 
     def _parse_login_data(self, login_data):
-        import pprint
+        """
+            Reconciles the team directory with the login data: objects that changed are updated in place (so that
+            the objects modules hold on to stay current), new ones are added, and the ones that are gone are removed.
+            Events are broadcast for what changed, unless this is the first time the directory is loaded.
+        """
+        broadcast = self._directory_loaded
+        users = self._reconcile_object_list(self._users, login_data['users'], self.SlackUser)
+        groups = self._reconcile_object_list(self._groups, login_data['groups'], self.SlackGroup, self)
+        dms = self._reconcile_object_list(self._dms, login_data['ims'], self.SlackDirectMessage, self)
+        channels = self._reconcile_object_list(self._channels, login_data['channels'], self.SlackChannel, self)
+
+        for channel in channels[2] + groups[2]:
+            channel._set_members(frozenset())
+
+        for user in users[2]:
+            for channel in self._channels_by_user.pop(user.id, ()):
+                channel._members = None
+
+        if broadcast:
+            self._broadcast_user_changes(*users)
+            self._broadcast_channel_changes(events.Channel, *channels)
+            self._broadcast_channel_changes(events.Group, *groups)
+            for dm in dms[0]:
+                self._broadcast_event(events.DirectMessage.Created, channel=dm)
+
+    def _reconcile_directory(self):
+        try:
+            login_data = self._rtm_call('rtm.start', no_unreads=1, no_latest=1)
+            if self._recorder:
+                self._recorder.record_login(login_data)
+            self._parse_login_data(login_data)
+            self._directory_stale = False
+            logger.info('Reconciled the slack directory snapshot with slack')
+
+        except Exception:
+            logger.exception('Could not reconcile the slack directory snapshot, it will be retried on reconnect.')
+
+    def _load_snapshot(self):
+        start = time.time()
+        directory = self._snapshot.load()
+        if directory is None:
+            return
+
+        # The snapshot stands in for the login data until the directory is reconciled, so it's what a capture needs
+        # to make sense of the frames received until then.
+        if self._recorder:
+            self._recorder.record_login(directory)
+        self._parse_login_data(directory)
+        self._directory_loaded = True
+        self._directory_stale = True
+        logger.info('Loaded the slack directory snapshot (%d users, %d channels, %d groups, %d DMs) in %.3f seconds',
+                    len(self._users), len(self._channels), len(self._groups), len(self._dms), time.time() - start)
+
+    def _save_snapshot(self):
+        if not self._directory_loaded:
+            return
+
+        with self._snapshot_lock:
+            directory = {
+                'users': self._serialize_object_list(self._users),
+                'channels': self._serialize_object_list(self._channels),
+                'groups': self._serialize_object_list(self._groups),
+                'ims': self._serialize_object_list(self._dms),
+            }
+
+            # The snapshot is compressed and written in a thread, so that the disk doesn't stall the hub.
+            try:
+                with self._jeev.metrics.histogram('slack_snapshot_save_seconds').time():
+                    get_hub().threadpool.apply(self._snapshot.save, (directory,))
+
+            except Exception:
+                logger.exception('Could not save the slack directory snapshot')
+
+    def _serialize_object_list(self, objects):
+        items = []
+        for i, obj in enumerate(list(objects), 1):
+            items.append(obj._data())
+            if i % self.login_batch_size == 0:
+                sleep(0)
+
+        return items
+
+    def _reconcile_object_list(self, objects, items, cls, *args):
+        """
+            Brings `objects` in line with `items` (the data of every object, as sent by slack), yielding to the hub
+            every `login_batch_size` objects. Returns the objects that were added, the (object, previous values of the
+            fields that changed) of the objects that changed, and the objects that were removed.
+        """
+        added = []
+        changed = []
+        ids = set()
+
+        for i, data in enumerate(items, 1):
+            ids.add(data['id'])
+            if data['id'] in objects:
+                obj = objects[data['id']]
+                previous = obj._update(**data)
+                if previous:
+                    changed.append((obj, previous))
+                    if not obj.indexed_fields.isdisjoint(previous):
+                        objects.add(obj)
+
+            else:
+                obj = cls(data, *args)
+                objects.add(obj)
+                added.append(obj)
+
+            if i % self.login_batch_size == 0:
+                sleep(0)
+
+        removed = [obj for obj in objects if obj.id not in ids]
+        for obj in removed:
+            objects.remove(obj)
 
-        pprint.pprint(login_data)
-        self._users.clear()
-        self._channels.clear()
-        self._dms.clear()
-        self._outgoing_messages.clear()
+        return added, changed, removed
 
-        for user in login_data['users']:
-            self._users.add(self.SlackUser(user))
+    def _broadcast_user_changes(self, added, changed, removed):
+        for user in added:
+            self._broadcast_event(events.Team.Joined, user=user)
 
-        for group in login_data['groups']:
-            self._groups.add(self.SlackGroup(group, self))
+        for user, previous in changed:
+            if 'presence' in previous:
+                self._broadcast_event(events.User.PresenceChanged, user=user)
 
-        for dm in login_data['ims']:
-            self._dms.add(self.SlackDirectMessage(dm, self))
+            if len(previous) > 1 or 'presence' not in previous:
+                self._broadcast_event(events.User.Changed, user=user)
 
-        for channel in login_data['channels']:
-            self._channels.add(self.SlackChannel(channel, self))
+    def _broadcast_channel_changes(self, category, added, changed, removed):
+        """
+            Broadcasts the events of `category` (`events.Channel` or `events.Group`, which share most of their events)
+            for the channels or groups that changed while reconciling the directory.
+        """
+        for channel in added:
+            if category is events.Channel:
+                self._broadcast_event(events.Channel.Created, channel=channel)
+                if channel._fields.get('is_member'):
+                    self._broadcast_event(events.Channel.Joined, channel=channel)
+
+            else:
+                self._broadcast_event(events.Group.Joined, channel=channel)
+
+        for channel, previous in changed:
+            if 'name' in previous:
+                self._broadcast_event(category.Renamed, channel=channel)
+
+            if 'is_archived' in previous:
+                archived = channel._fields['is_archived']
+                self._broadcast_event(category.Archived if archived else category.UnArchived, channel=channel)
+
+            # Groups only ever list the groups jeev is in, and have no Left event.
+            if 'is_member' in previous and category is events.Channel:
+                joined = channel._fields['is_member']
+                self._broadcast_event(events.Channel.Joined if joined else events.Channel.Left, channel=channel)
+
+            if 'topic' in previous:
+                self._broadcast_event(category.TopicUpdated, channel=channel)
+
+            if 'purpose' in previous:
+                self._broadcast_event(category.PurposeUpdated, channel=channel)
+
+            if 'members' in previous:
+                before = previous['members']
+                after = channel.member_ids
+                for user_id in after - before:
+                    self._broadcast_event(category.UserJoined, channel=channel, user=self._users.get(user_id))
+
+                for user_id in before - after:
+                    self._broadcast_event(category.UserLeft, channel=channel, user=self._users.get(user_id))
+
+        if category is events.Channel:
+            for channel in removed:
+                self._broadcast_event(events.Channel.Deleted, channel=channel)
 
     def _process_post_method_hooks(self, method, kwargs, data):
         if data['ok']:
@@ -484,9 +1310,39 @@ class SlackAdapter(object):
         return data
 
     def _broadcast_event(self, event, **kwargs):
-        pass
+        self._jeev._handle_event(event, **kwargs)
+
+    def _send_to_websocket(self, data):
+        # Not sent through slackclient's Server.send_to_websocket, which swallows errors and reconnects on its own,
+        # with rtm.start, outside of the connection loop and its backoff. Instead, the broken connection is aborted,
+        # so that the connection loop notices and reconnects.
+        websocket = self._server.websocket if self._server else None
+        if websocket is None:
+            raise WebSocketConnectionClosedException('Not connected to slack.')
+
+        try:
+            websocket.send(json.dumps(data))
+
+        except Exception:
+            websocket.abort()
+            raise
+
+    def _on_message_sent(self, delay):
+        self._jeev.metrics.incr('slack_messages_sent_total')
+        self._jeev.metrics.histogram('slack_send_delay_seconds').observe(delay)
+
+    def _send(self, channel, data, priority=False):
+        """
+            Sends data over the websocket, through the outgoing scheduler if there is one, to respect slack's rate
+            limits.
+        """
+        if self._scheduler:
+            self._scheduler.schedule(channel.id, data, priority)
 
-    def send_message(self, channel, message):
+        else:
+            self._send_to_websocket(data)
+
+    def send_message(self, channel, message, priority=False):
         if not isinstance(channel, SlackAdapter._SlackChannelBase) and \
                 not isinstance(channel, SlackAdapter._SlackGroupBase):
             channel = self._channels.find(channel)
@@ -496,8 +1352,8 @@ class SlackAdapter(object):
 
         message = SlackAdapter.MutableOutgoingMessage(self, channel, message)
         logging.debug("Sending message %r", message)
-        self._server.send_to_websocket(message.serialize())
         self._outgoing_messages[message.id] = message
+        self._send(channel, message.serialize(), priority)
         return message
 
     def send_messages(self, channel, *messages):
@@ -524,7 +1380,7 @@ class SlackAdapter(object):
             for k, v in a.message_overrides.items():
                 args[k] = v
 
-        self._server.send_to_websocket(args)
+        self._send(channel, args)
 
     def _generate_message_id(self):
         self._last_id += 1
@@ -539,43 +1395,118 @@ class SlackAdapter(object):
             return self._get_channel(id)
 
     def _get_dm(self, id):
-        if id not in self._dms:
-            self._refresh_dms()
+        if id not in self._dms and not self._is_missing(id):
+            self._single_flight(('im.list',), self._refresh_dms)
+            self._check_found(id, self._dms)
+
         return self._dms[id]
 
     def _refresh_dms(self):
         dms = self.api.im.list()
         for dm in dms['ims']:
-            self._dms.add(self.SlackDirectMessage(dm, self))
+            self._merge_object(self._dms, self.SlackDirectMessage, dm, self)
 
     def _get_group(self, id):
-        if id not in self._groups:
-            self._refresh_groups()
+        if id not in self._groups and not self._is_missing(id):
+            self._single_flight(('groups.list',), self._refresh_groups)
+            self._check_found(id, self._groups)
+
         return self._groups[id]
 
     def _refresh_groups(self):
         groups = self.api.groups.list()
         for group in groups['groups']:
-            self._groups.add(self.SlackDirectMessage(group, self))
+            self._merge_object(self._groups, self.SlackGroup, group, self)
 
     def _get_channel(self, id):
-        if id not in self._channels:
-            self._refresh_channels()
+        if id not in self._channels and not self._is_missing(id):
+            self._single_flight(('channels.list',), self._refresh_channels)
+            self._check_found(id, self._channels)
+
         return self._channels[id]
 
     def _refresh_channels(self):
         channels = self.api.channels.list()
         for channel in channels['channels']:
-            self._channels.add(self.SlackDirectMessage(channel, self))
+            self._merge_object(self._channels, self.SlackChannel, channel, self)
 
     def _get_user(self, id):
-        if id not in self._users:
-            user = self.api.user.info(user=id)
-            if not user['ok']:
-                return None
-            self._users.add(self.SlackUser(user['user']))
+        if id not in self._users and not self._is_missing(id):
+            self._single_flight(('users.info', id), self._refresh_user, id)
+            self._check_found(id, self._users)
+
+        if id in self._users:
+            return self._users[id]
+
+    def _refresh_user(self, id):
+        user = self.api.users.info(user=id)
+        if user['ok']:
+            self._merge_object(self._users, self.SlackUser, user['user'])
+
+    def _merge_object(self, objects, cls, data, *args):
+        """
+            Adds the object to the list, updating the existing object in place if there is one, so that the objects
+            modules are holding on to stay current.
+        """
+        if data['id'] in objects:
+            obj = objects[data['id']]
+            obj._update(**data)
+
+        else:
+            obj = cls(data, *args)
+
+        objects.add(obj)
+        return obj
+
+    def _single_flight(self, key, f, *args):
+        """
+            Calls `f`, unless a call with the same key is already in flight, in which case that call's result is
+            waited for instead. Concurrent misses for the same directory objects then share one API call.
+        """
+        result = self._in_flight.get(key)
+        if result is not None:
+            self._jeev.metrics.incr('slack_directory_refreshes_shared_total', method=key[0])
+            return result.get()
+
+        self._jeev.metrics.incr('slack_directory_refreshes_total', method=key[0])
+        result = self._in_flight[key] = AsyncResult()
+        try:
+            value = f(*args)
+
+        except Exception, e:
+            result.set_exception(e)
+            raise
+
+        else:
+            result.set(value)
+            return value
+
+        finally:
+            del self._in_flight[key]
+
+    def _is_missing(self, id):
+        """
+            Whether a refresh recently found that the id doesn't exist, in which case it's not refreshed again until
+            `missing_id_ttl` seconds have passed.
+        """
+        expires_at = self._missing_ids.get(id)
+        if expires_at is None:
+            return False
+
+        if expires_at > time.time():
+            self._jeev.metrics.incr('slack_directory_missing_hits_total')
+            return True
+
+        del self._missing_ids[id]
+        return False
+
+    def _check_found(self, id, objects):
+        if id in objects:
+            return
 
-        return self._users[id]
+        if len(self._missing_ids) >= self.max_missing_ids:
+            self._missing_ids.clear()
 
+        self._missing_ids[id] = time.time() + self._missing_id_ttl
 
 adapter = SlackAdapter
@@ -0,0 +1,54 @@
+import gzip
+import json
+import logging
+import time
+
+logger = logging.getLogger('jeev.adapter.slack_capture')
+
+
+class FrameRecorder(object):
+    """
+        Tees the login data and every raw websocket frame the slack adapter receives to a gzipped capture file, as
+        JSON lines of {"t": receive_time, "login_data": {...}} or {"t": receive_time, "frame": "..."}.
+
+        The capture can be played back with the `slack_replay` adapter.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._file = None
+        self.frames = 0
+
+    def start(self):
+        logger.info("Recording slack frames to %s", self._path)
+        # Appending adds a new gzip member to the file, which reads back just like a single one.
+        self._file = gzip.open(self._path, 'ab')
+
+    def stop(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _write(self, record):
+        if self._file:
+            self._file.write(json.dumps(record))
+            self._file.write('\n')
+
+    def record_login(self, login_data):
+        self._write({'t': time.time(), 'login_data': login_data})
+        if self._file:
+            self._file.flush()
+
+    def record_frame(self, frame):
+        self._write({'t': time.time(), 'frame': frame})
+        self.frames += 1
+
+
+def read_capture(path):
+    """
+        Yields the records stored in a capture file, in the order they were recorded.
+    """
+    with gzip.open(path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,94 @@
+import logging
+import time
+from gevent import sleep
+from .slack import SlackAdapter
+from .slack_capture import read_capture
+
+logger = logging.getLogger('jeev.adapter.slack_replay')
+
+
+class SlackReplayAdapter(SlackAdapter):
+    """
+        Plays back a capture recorded by the slack adapter (see `JEEV_ADAPTER_CAPTURE_PATH`) through the slack
+        adapter's frame handling, without connecting to slack. Outgoing messages and API calls are swallowed.
+
+        The capture is played at its original speed, multiplied by `replay_speed`. A speed of 0 plays it back as fast
+        as possible.
+    """
+
+    def __init__(self, jeev, opts):
+        super(SlackReplayAdapter, self).__init__(jeev, opts)
+        self._replay_path = opts['replay_path']
+        self._replay_speed = float(opts.get('replay_speed', 1))
+        # Nothing is actually sent, so there are no rate limits to respect.
+        self._scheduler = None
+        self._transport = _ReplayTransport()
+
+    def _run(self):
+        self._server = _ReplayServer()
+        frames = 0
+        first_record_at = None
+        started_at = time.time()
+
+        for record in read_capture(self._replay_path):
+            if first_record_at is None:
+                first_record_at = record['t']
+
+            if self._replay_speed:
+                delay = (record['t'] - first_record_at) / self._replay_speed - (time.time() - started_at)
+                if delay > 0:
+                    sleep(delay)
+
+            elif frames % 100 == 0:
+                # Let the rest of Jeev handle what was played back so far.
+                sleep(0)
+
+            if 'login_data' in record:
+                self._parse_login_data(record['login_data'])
+
+            else:
+                self._handle_frame(record['frame'])
+                frames += 1
+
+        elapsed = time.time() - started_at
+        logger.info("Replayed %d frames in %.3f seconds (%.1f frames/sec)", frames, elapsed,
+                    frames / elapsed if elapsed else float('inf'))
+
+
+class _ReplayServer(object):
+    """
+        Stands in for slackclient's Server while replaying.
+    """
+
+    def __init__(self):
+        self.websocket = _ReplayWebSocket()
+
+
+class _ReplayWebSocket(object):
+    """
+        Stands in for the websocket of slackclient's Server while replaying. Nothing is sent.
+    """
+
+    def send(self, data):
+        pass
+
+    def abort(self):
+        pass
+
+
+class _ReplayTransport(object):
+    """
+        Stands in for the slack API transport while replaying. API calls return empty results.
+    """
+
+    def call(self, method, params):
+        if method.endswith('.list'):
+            return {'ok': True, 'channels': [], 'groups': [], 'ims': [], 'members': []}
+
+        return {'ok': False, 'error': 'replaying'}
+
+    def close(self):
+        pass
+
+
+adapter = SlackReplayAdapter
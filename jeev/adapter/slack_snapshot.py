@@ -0,0 +1,47 @@
+import gzip
+import json
+import logging
+import os
+
+logger = logging.getLogger('jeev.adapter.slack_snapshot')
+
+
+class DirectorySnapshot(object):
+    """
+        Saves the slack adapter's team directory to a gzipped JSON file, in the same shape as the login data of
+        rtm.start ({"users": [...], "channels": [...], "groups": [...], "ims": [...]}), so that it can be loaded back
+        through the adapter's login data parsing on the next start.
+    """
+    version = 1
+
+    def __init__(self, path):
+        self._path = path
+
+    def save(self, directory):
+        # Written to a temporary file first, so that a crash while saving doesn't leave a truncated snapshot behind.
+        tmp_path = '%s.tmp' % self._path
+        with gzip.open(tmp_path, 'wb', 1) as f:
+            f.write(json.dumps(dict(directory, version=self.version), separators=(',', ':')))
+
+        os.rename(tmp_path, self._path)
+
+    def load(self):
+        """
+            Returns the saved directory, or None if there is no (usable) snapshot.
+        """
+        if not os.path.exists(self._path):
+            return None
+
+        try:
+            with gzip.open(self._path, 'rb') as f:
+                directory = json.load(f)
+
+        except (IOError, ValueError):
+            logger.exception("Could not read the slack directory snapshot %s", self._path)
+            return None
+
+        if directory.get('version') != self.version:
+            logger.warning("Ignoring the slack directory snapshot %s, which has an unknown version", self._path)
+            return None
+
+        return directory
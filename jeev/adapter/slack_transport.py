@@ -0,0 +1,44 @@
+import logging
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger('jeev.adapter.slack_transport')
+
+
+class SlackHttpTransport(object):
+    """
+        Makes slack web API calls over a pool of persistent (keep-alive) HTTPS connections, so that API calls don't
+        pay for a new connection and TLS handshake every time. Records the latency of every call per API method.
+    """
+    base_url = 'https://slack.com/api/'
+
+    def __init__(self, adapter, token, pool_size=10, timeout=10):
+        self._adapter = adapter
+        self._token = token
+        self._timeout = timeout
+        self._session = requests.Session()
+        self._session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+
+    def call(self, method, params):
+        """
+            Calls the API method with params, and returns the decoded response.
+        """
+        data = dict(params, token=self._token)
+        metrics = self._adapter._jeev.metrics
+        start = time.time()
+
+        try:
+            response = self._session.post(self.base_url + method, data=data, timeout=self._timeout)
+            response.raise_for_status()
+            return response.json()
+
+        except Exception:
+            metrics.incr('slack_api_errors_total', method=method)
+            raise
+
+        finally:
+            metrics.histogram('slack_api_seconds', method=method).observe(time.time() - start)
+
+    def close(self):
+        self._session.close()
@@ -0,0 +1,124 @@
+import gc
+import json
+import math
+import time
+from .message import Message
+
+
+class BenchAdapter(object):
+    """
+        An adapter that swallows everything Jeev sends, used to benchmark message dispatch without a chat server.
+    """
+
+    def __init__(self, jeev, opts):
+        self._jeev = jeev
+        self._opts = opts
+        self.sent = 0
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def send_message(self, channel, message, priority=False):
+        self.sent += 1
+        return _BenchOutgoingMessage(channel, message)
+
+    def send_messages(self, channel, *messages):
+        for message in messages:
+            self.send_message(channel, message)
+
+    def send_attachment(self, channel, *attachments):
+        self.sent += 1
+
+
+class _BenchOutgoingMessage(object):
+    __slots__ = ['channel', 'message']
+
+    def __init__(self, channel, message):
+        self.channel = channel
+        self.message = message
+
+    def update(self, message):
+        self.message = message
+
+
+def read_corpus(path):
+    """
+        Reads a corpus of messages, stored as JSON lines of {"channel": ..., "user": ..., "text": ...}.
+    """
+    corpus = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+
+            entry = json.loads(line)
+            corpus.append((entry.get('channel', 'bench'), entry.get('user', 'bench'), entry['text']))
+
+    return corpus
+
+
+def run_bench(j, corpus, repeat=1):
+    """
+        Feeds the corpus through `Modules._handle_message` `repeat` times, and returns the results of the run.
+    """
+    j.adapter = BenchAdapter(j, {})
+    handle_message = j.modules._handle_message
+    targeting_me = j._targeting_me
+
+    for _, stats in j.metrics.iter_handler_stats():
+        stats.durations = []
+
+    gc.collect()
+    objects_before = len(gc.get_objects())
+    start = time.time()
+
+    for _ in xrange(repeat):
+        for channel, user, text in corpus:
+            message = Message({}, channel, user, text)
+            message._jeev = j
+            message.targeting_jeev = message.is_direct_message or bool(targeting_me(message.message))
+            handle_message(message)
+
+    elapsed = time.time() - start
+    gc.collect()
+    objects_after = len(gc.get_objects())
+
+    count = len(corpus) * repeat
+    return {
+        'messages': count,
+        'elapsed': elapsed,
+        'messages_per_second': count / elapsed if elapsed else float('inf'),
+        'replies': j.adapter.sent,
+        'objects_retained': objects_after - objects_before,
+        'handlers': j.metrics.handler_stats(),
+    }
+
+
+def print_results(results):
+    print 'Handled %(messages)d messages in %(elapsed).3f seconds (%(messages_per_second).1f messages/sec)' % results
+    print 'Sent %(replies)d replies, %(objects_retained)d gc tracked objects retained after the run' % results
+    print
+
+    handlers = [(module_name, stats) for module_name, stats in results['handlers'] if stats.durations]
+    if not handlers:
+        print 'No handlers were called.'
+        return
+
+    print '%-40s %8s %8s %10s %10s %10s %10s' % ('handler', 'calls', 'errors', 'mean', 'p50', 'p90', 'p99')
+    for module_name, stats in handlers:
+        durations = sorted(stats.durations)
+        print '%-40s %8d %8d %10.6f %10.6f %10.6f %10.6f' % (
+            '%s.%s' % (module_name, stats.name), stats.calls, stats.errors, sum(durations) / len(durations),
+            exact_percentile(durations, 50), exact_percentile(durations, 90), exact_percentile(durations, 99))
+
+
+def exact_percentile(durations, percentile):
+    """
+        Returns the exact percentile (0 - 100) of the sorted durations, using the nearest rank.
+    """
+    rank = int(math.ceil(len(durations) * percentile / 100.0))
+    return durations[max(rank, 1) - 1]
@@ -0,0 +1,249 @@
+from collections import deque
+import logging
+import gevent
+from gevent.lock import Semaphore
+
+logger = logging.getLogger('jeev.dispatch')
+
+
+class Dispatcher(object):
+    """
+        Runs incoming messages through a bounded pool of worker greenlets, queueing messages when all the workers are
+        busy. When the queue is full, the overflow policy decides what happens to new messages:
+
+        * `block`: The caller (usually the adapter) is blocked until there is room in the queue.
+        * `drop_oldest`: The oldest queued message is dropped to make room.
+        * `drop_low_priority`: Messages from low priority channels are dropped. A message from any other channel will
+          replace the oldest queued low priority message, or block if there are none queued.
+
+        A pool size of 0 disables the pool, and spawns a greenlet for every message.
+
+        The dispatch mode decides how messages are ordered:
+
+        * `concurrent`: Every message is handled as soon as there is a free worker, so messages from the same channel
+          may be handled out of order if a handler yields.
+        * `channel`: Messages from the same channel are handled sequentially, in the order they were received, in a
+          lane that lives as long as the channel has messages waiting. Different channels are still handled in
+          parallel.
+    """
+    overflow_policies = 'block', 'drop_oldest', 'drop_low_priority'
+    modes = 'concurrent', 'channel'
+
+    def __init__(self, handler, pool_size=50, queue_size=500, overflow='block', low_priority_channels=(),
+                 mode='concurrent'):
+        if overflow not in self.overflow_policies:
+            raise ValueError("Unknown dispatch overflow policy %r (expected one of: %s)" % (
+                overflow, ', '.join(self.overflow_policies)))
+
+        if mode not in self.modes:
+            raise ValueError("Unknown dispatch mode %r (expected one of: %s)" % (mode, ', '.join(self.modes)))
+
+        self._handler = handler
+        self._pool_size = pool_size
+        self._queue_size = queue_size
+        self._overflow = overflow
+        self._ordered = mode == 'channel'
+        self._lanes = {}
+        self._low_priority_channels = set(c.lower() for c in low_priority_channels)
+        self._queue = deque()
+        self._items = Semaphore(0)
+        self._slots = Semaphore(queue_size)
+        self._workers = []
+
+        self.queued = 0
+        self.dropped = 0
+        self.processed = 0
+
+    @property
+    def queue_depth(self):
+        """
+            The number of messages waiting to be handled.
+        """
+        return len(self._queue) + sum(len(lane) for lane in self._lanes.itervalues())
+
+    @property
+    def busy_workers(self):
+        return sum(1 for w in self._workers if w.busy)
+
+    def stats(self):
+        return {
+            'pool_size': self._pool_size,
+            'queue_size': self._queue_size,
+            'queue_depth': self.queue_depth,
+            'busy_workers': self.busy_workers,
+            'lanes': len(self._lanes),
+            'queued': self.queued,
+            'dropped': self.dropped,
+            'processed': self.processed,
+        }
+
+    def start(self):
+        if self._workers:
+            raise RuntimeError("Dispatcher already started.")
+
+        for _ in xrange(self._pool_size):
+            worker = _Worker(self)
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self):
+        # The messages that were waiting are dropped, and their slots given back, so that the dispatcher can be
+        # started again from scratch. Giving back the slots also wakes up anyone blocked on dispatching a message.
+        self.dropped += self.queue_depth
+        gevent.killall(self._workers)
+        self._workers[:] = []
+
+        self._queue.clear()
+        self._lanes.clear()
+        while self._items.acquire(blocking=False):
+            pass
+
+        while self._slots.counter < self._queue_size:
+            self._slots.release()
+
+    def dispatch(self, message):
+        if not self._pool_size:
+            self.queued += 1
+            gevent.spawn_raw(self._process, message)
+            return
+
+        if self._slots.locked() and not self._make_room(message):
+            self.dropped += 1
+            logger.warning("Dispatch queue is full, dropping message %r", message)
+            return
+
+        self._slots.acquire()
+        self._queue.append(message)
+        self.queued += 1
+        self._items.release()
+
+    def _make_room(self, message):
+        """
+            Applies the overflow policy when the queue is full. Returns False if message should be dropped, otherwise
+            the message will be queued, blocking if there still isn't room for it.
+
+            In `channel` mode, the messages waiting in a lane hold on to their queue slots, so they're considered too.
+            They were all taken off the queue before any of the messages still in it, so `drop_oldest` drops them
+            first, starting with the lane of the channel that has the most messages waiting.
+        """
+        if self._overflow == 'drop_oldest':
+            lane = self._longest_lane()
+            if lane:
+                self._drop(lane[0], lane)
+
+            elif self._queue:
+                self._drop(self._queue[0])
+
+        elif self._overflow == 'drop_low_priority':
+            if self._is_low_priority(message):
+                return False
+
+            # All the messages of a lane are from the same channel, so its first message tells its priority.
+            for lane in self._lanes.itervalues():
+                if lane and self._is_low_priority(lane[0]):
+                    self._drop(lane[0], lane)
+                    break
+
+            else:
+                for queued_message in self._queue:
+                    if self._is_low_priority(queued_message):
+                        self._drop(queued_message)
+                        break
+
+        return True
+
+    def _longest_lane(self):
+        """
+            Returns the lane with the most messages waiting in it, or None if no messages are waiting in a lane.
+        """
+        lane = max(self._lanes.itervalues(), key=len) if self._lanes else None
+        if lane:
+            return lane
+
+    def _drop(self, message, lane=None):
+        if lane is not None:
+            # The message was already taken off the queue, so it only has its slot to give back.
+            lane.remove(message)
+
+        else:
+            # Removing a queued message frees up its slot, but the item count has to be taken back too, which never
+            # blocks, as the message was in the queue.
+            self._queue.remove(message)
+            self._items.acquire()
+
+        self._slots.release()
+        self.dropped += 1
+        logger.warning("Dispatch queue is full, dropping message %r", message)
+
+    def _is_low_priority(self, message):
+        if not self._low_priority_channels:
+            return False
+
+        channel = message.channel
+        for key in (getattr(channel, 'id', None), getattr(channel, 'name', channel)):
+            if isinstance(key, basestring) and key.lower() in self._low_priority_channels:
+                return True
+
+        return False
+
+    def _lane_key(self, message):
+        return getattr(message.channel, 'id', message.channel)
+
+    def _next_message(self):
+        self._items.acquire()
+        return self._queue.popleft()
+
+    def _process(self, message):
+        if not self._ordered:
+            return self._run_handler(message)
+
+        # If another worker is handling a message from this channel, it'll pick this one up when it's done.
+        key = self._lane_key(message)
+        lane = self._lanes.get(key)
+        if lane is not None:
+            lane.append(message)
+            return
+
+        lane = self._lanes[key] = deque()
+        try:
+            while True:
+                self._run_handler(message)
+                if not lane:
+                    break
+
+                message = lane.popleft()
+
+        finally:
+            self._lanes.pop(key, None)
+
+    def _run_handler(self, message):
+        # The message holds on to its queue slot until it is handled, even while waiting in a lane, so that lanes
+        # are bounded by the queue size too.
+        if self._pool_size:
+            self._slots.release()
+
+        try:
+            self._handler(message)
+
+        except Exception:
+            logger.exception("Error handling message %r", message)
+
+        finally:
+            self.processed += 1
+
+
+class _Worker(gevent.Greenlet):
+    def __init__(self, dispatcher):
+        super(_Worker, self).__init__()
+        self.dispatcher = dispatcher
+        self.busy = False
+
+    def _run(self):
+        dispatcher = self.dispatcher
+        while True:
+            message = dispatcher._next_message()
+            self.busy = True
+            try:
+                dispatcher._process(message)
+            finally:
+                self.busy = False
@@ -25,6 +25,8 @@ class EventCategoryBase(type):
 
 
 class Message(object):
+    __metaclass__ = EventCategoryBase
+
     MessageChanged = _Event()
     MessageDeleted = _Event()
 
@@ -62,11 +64,11 @@ class User(object):
 class DirectMessage(object):
     __metaclass__ = EventCategoryBase
 
-    Created = _Event("A direct message channel was created.")
-    Opened = _Event("You opened a direct message channel.")
-    Closed = _Event("You closed a direct message channel.")
-    Marked = _Event("A direct message read marker was updated.")
-    HistoryChanged = _Event("Bulk updates were made to a DM channel's history.")
+    Created = _Event(help_text="A direct message channel was created.")
+    Opened = _Event(help_text="You opened a direct message channel.")
+    Closed = _Event(help_text="You closed a direct message channel.")
+    Marked = _Event(help_text="A direct message read marker was updated.")
+    HistoryChanged = _Event(help_text="Bulk updates were made to a DM channel's history.")
 
     Message = _Event(help_text="A direct message was received.")
     MeMessage = _Event()
@@ -75,13 +77,13 @@ class DirectMessage(object):
 class Group(object):
     __metaclass__ = EventCategoryBase
 
-    Joined = _Event("You joined a private group.")
-    Opened = _Event("You left a private group.")
-    Closed = _Event("You opened a group channel.")
-    Renamed = _Event("You closed a group channel.")
-    Archived = _Event("A private group was archived.")
-    UnArchived = _Event("A private group was unarchived.")
-    HistoryChanged = _Event("A private group was renamed.")
+    Joined = _Event(help_text="You joined a private group.")
+    Opened = _Event(help_text="You opened a group channel.")
+    Closed = _Event(help_text="You closed a group channel.")
+    Renamed = _Event(help_text="A private group was renamed.")
+    Archived = _Event(help_text="A private group was archived.")
+    UnArchived = _Event(help_text="A private group was unarchived.")
+    HistoryChanged = _Event(help_text="Bulk updates were made to a private group's history.")
 
     UserJoined = _Event(help_text="A team member joined a group.")
     UserLeft = _Event(help_text="A team member left a group.")
@@ -96,4 +98,4 @@ class Group(object):
 class Team(object):
     __metaclass__ = EventCategoryBase
 
-    Joined = _Event("A new team member has joined.")
\ No newline at end of file
+    Joined = _Event(help_text="A new team member has joined.")
\ No newline at end of file
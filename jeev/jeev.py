@@ -1,10 +1,14 @@
+import inspect
 import logging
 import re
 import gevent
 import time
 from gevent.event import Event
 from .adapter import get_adapter_by_name
+from .dispatch import Dispatcher
+from .metrics import Metrics
 from .utils.periodic import Periodic
+from .utils.blocking import BlockingDetector
 from .storage import get_store_by_name
 from .web import Web
 from .module import Modules
@@ -14,9 +18,26 @@ from . import version
 logger = logging.getLogger('jeev.jeev')
 
 
+def _accepts_priority(send_message):
+    """
+        Returns whether an adapter's `send_message` takes a `priority` argument. Adapters written before outgoing
+        messages had priorities only take `(channel, message)`.
+    """
+    try:
+        args, _, keywords, _ = inspect.getargspec(send_message)
+
+    except TypeError:
+        return False
+
+    return 'priority' in args or keywords is not None
+
+
 class Jeev(object):
     _name = None
+    _adapter = None
+    _adapter_accepts_priority = False
     _web = None
+    _blocking_detector = None
     _targeting_me = None
     _targeting_me_re = None
 
@@ -32,15 +53,31 @@ class Jeev(object):
         self._storage = storage_class(self, opts_for('storage'))
         self.adapter = adapter_class(self, opts_for('adapter'))
         self.modules = Modules(self)
+        self.metrics = Metrics(self)
         self.name = self._opts.get('name', 'Jeev')
         self._storage_sync_periodic = Periodic(int(self._opts.get('storage_sync_interval', 600)),
                                                self.modules._save_loaded_module_data)
+        self.dispatcher = Dispatcher(self.__handle_message,
+                                     pool_size=int(self._opts.get('dispatch_pool_size', 50)),
+                                     queue_size=int(self._opts.get('dispatch_queue_size', 500)),
+                                     overflow=self._opts.get('dispatch_overflow', 'block'),
+                                     low_priority_channels=self._get_list_opt('dispatch_low_priority_channels'),
+                                     mode=self._opts.get('dispatch_mode', 'concurrent'))
         self._stop_event = Event()
         self._stop_event.set()
 
+    def _get_list_opt(self, key):
+        value = self._opts.get(key, '')
+        return [v.strip() for v in value.split(',') if v.strip()]
+
     def _handle_message(self, message):
-        # Schedule the handling of the message to occur during the next iteration of the event loop.
-        gevent.spawn_raw(self.__handle_message, message)
+        # Hand the message off to the dispatcher, which will handle it in one of its workers.
+        self.dispatcher.dispatch(message)
+
+    def _handle_event(self, event, **kwargs):
+        # Events are delivered to the modules subscribed to them with `module.on`.
+        self.metrics.incr('events_total', event='%s.%s' % (event.class_name, event.attribute_name))
+        self.modules._handle_event(event, kwargs)
 
     def __handle_message(self, message):
         logger.debug("Incoming message %r", message)
@@ -50,6 +87,7 @@ class Jeev(object):
         message.targeting_jeev = message.is_direct_message or bool(self._targeting_me(message.message))
         self.modules._handle_message(message)
         end = time.time()
+        self.metrics.dispatch_latency.observe(end - start)
 
         logger.debug("Took %.5f seconds to handle message %r", end - start, message)
 
@@ -61,6 +99,15 @@ class Jeev(object):
     def name(self):
         return self._name
 
+    @property
+    def adapter(self):
+        return self._adapter
+
+    @adapter.setter
+    def adapter(self, adapter):
+        self._adapter = adapter
+        self._adapter_accepts_priority = _accepts_priority(adapter.send_message)
+
     @name.setter
     def name(self, value):
         self._name = value
@@ -92,6 +139,10 @@ class Jeev(object):
 
         logger.info("Starting Jeev v%s", self.version)
 
+        if self._opts.get('blocking_threshold'):
+            self._blocking_detector = BlockingDetector(self, float(self._opts['blocking_threshold']))
+            self._blocking_detector.start()
+
         logger.info("Starting storage %s", self._storage)
         self._storage.start()
 
@@ -102,6 +153,8 @@ class Jeev(object):
             self._web = Web(self, EnvFallbackDict('web', getattr(self.config, 'web_opts', {})))
             self._web.start()
 
+        self.dispatcher.start()
+
         logger.info("Starting adapter %s", self.adapter)
         self.adapter.start()
         self._storage_sync_periodic.start(right_away=False)
@@ -137,16 +190,25 @@ class Jeev(object):
                 self._web = None
 
             self.adapter.stop()
+            self.dispatcher.stop()
             self._storage_sync_periodic.stop()
             self._storage.stop()
 
+            if self._blocking_detector:
+                self._blocking_detector.stop()
+                self._blocking_detector = None
+
         finally:
             self._stop_event.set()
 
-    def send_message(self, channel, message):
+    def send_message(self, channel, message, priority=False):
         """
-            Convenience function to send a message to a channel.
+            Convenience function to send a message to a channel. Adapters that queue outgoing messages will send
+            priority messages (like replies) first.
         """
+        if priority and self._adapter_accepts_priority:
+            return self.adapter.send_message(channel, message, priority=True)
+
         return self.adapter.send_message(channel, message)
 
     def send_attachment(self, channel, *attachments):
@@ -26,7 +26,7 @@ class Message(object):
         return self.reply(message)
 
     def reply(self, message):
-        return self._jeev.send_message(self.channel, message)
+        return self._jeev.send_message(self.channel, message, priority=True)
 
     def reply_with_attachment(self, *attachment):
         return self._jeev.send_attachment(self.channel, *attachment)
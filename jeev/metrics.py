@@ -0,0 +1,290 @@
+import bisect
+import time
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram(object):
+    """
+        A fixed-bucket histogram. Observing a value doesn't allocate anything, it just bumps a bucket counter.
+
+        `counts[i]` is the number of values that were <= `buckets[i]` (and > `buckets[i - 1]`), and the last count is
+        for the values that didn't fit in any bucket.
+    """
+    __slots__ = ['buckets', 'counts', 'count', 'sum']
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def time(self):
+        """
+            Returns a context manager that observes the time spent inside of it.
+        """
+        return _HistogramTimer(self)
+
+    @property
+    def mean(self):
+        if self.count:
+            return self.sum / self.count
+
+        return 0.0
+
+    def percentile(self, percentile):
+        """
+            Estimates a percentile (0 - 100) of the observed values, by returning the upper bound of the bucket it
+            falls in. Returns inf if it falls past the last bucket.
+        """
+        if not self.count:
+            return 0.0
+
+        rank = self.count * percentile / 100.0
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+
+        return float('inf')
+
+    def serialize(self):
+        return {
+            'buckets': self.buckets,
+            'counts': self.counts[:],
+            'count': self.count,
+            'sum': self.sum,
+        }
+
+
+class _HistogramTimer(object):
+    __slots__ = ['histogram', 'start']
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.histogram.observe(time.time() - self.start)
+
+
+class HandlerStats(object):
+    """
+        Call counts and latencies of a single module handler.
+    """
+    __slots__ = ['name', 'calls', 'errors', 'timeouts', 'latency', 'regex_latency', 'durations']
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.latency = Histogram()
+        self.regex_latency = None
+        # The raw duration of every call, only recorded when this is set to a list (by `jeev bench`), as the histogram
+        # is too coarse to compare small latencies.
+        self.durations = None
+
+    def observe_regex(self, elapsed):
+        if self.regex_latency is None:
+            self.regex_latency = Histogram()
+
+        self.regex_latency.observe(elapsed)
+
+    def serialize(self):
+        return {
+            'name': self.name,
+            'calls': self.calls,
+            'errors': self.errors,
+            'timeouts': self.timeouts,
+            'latency': self.latency.serialize(),
+            'regex_latency': self.regex_latency and self.regex_latency.serialize()
+        }
+
+    def __repr__(self):
+        return '<HandlerStats %s calls=%d, errors=%d, timeouts=%d, mean=%.5f>' % (
+            self.name, self.calls, self.errors, self.timeouts, self.latency.mean
+        )
+
+
+class Metrics(object):
+    """
+        Jeev's metrics. Holds the dispatch histograms and any counters and histograms registered by Jeev's components,
+        and collects the handler stats of the loaded modules.
+    """
+
+    def __init__(self, jeev):
+        self._jeev = jeev
+        self.dispatch_latency = Histogram()
+        self._counters = {}
+        self._histograms = {}
+
+    def incr(self, name, amount=1, **labels):
+        """
+            Increments the counter named `name`, with the given labels.
+        """
+        key = name, tuple(sorted(labels.iteritems())) if labels else ()
+        self._counters[key] = self._counters.get(key, 0) + amount
+
+    def histogram(self, name, buckets=DEFAULT_BUCKETS, **labels):
+        """
+            Gets (or creates) the histogram named `name`, with the given labels.
+        """
+        key = name, tuple(sorted(labels.iteritems())) if labels else ()
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms[key] = Histogram(buckets)
+
+        return histogram
+
+    @property
+    def counters(self):
+        return self._counters
+
+    @property
+    def histograms(self):
+        return self._histograms
+
+    def iter_handler_stats(self):
+        """
+            Yields a (module_name, HandlerStats) tuple for every handler of every loaded module.
+        """
+        for module in self._jeev.modules._module_list:
+            for stats in module._handler_stats.itervalues():
+                yield module.name, stats
+
+    def handler_stats(self, module_name=None):
+        """
+            Returns a list of (module_name, HandlerStats), optionally only for the module named `module_name`, sorted
+            by the total time spent in each handler.
+        """
+        stats = [(name, s) for name, s in self.iter_handler_stats() if module_name is None or name == module_name]
+        stats.sort(key=lambda item: item[1].latency.sum, reverse=True)
+        return stats
+
+    def serialize(self):
+        modules = {}
+        for module_name, stats in self.iter_handler_stats():
+            modules.setdefault(module_name, []).append(stats.serialize())
+
+        return {
+            'dispatch_latency': self.dispatch_latency.serialize(),
+            'dispatcher': self._jeev.dispatcher.stats(),
+            'counters': [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in self._counters.iteritems()
+            ],
+            'histograms': [
+                dict(histogram.serialize(), name=name, labels=dict(labels))
+                for (name, labels), histogram in self._histograms.iteritems()
+            ],
+            'modules': modules
+        }
+
+    def render_prometheus(self):
+        """
+            Renders the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        dispatcher = self._jeev.dispatcher.stats()
+
+        def counter(name, value, help_text):
+            lines.append('# HELP jeev_%s %s' % (name, help_text))
+            lines.append('# TYPE jeev_%s counter' % name)
+            lines.append('jeev_%s %s' % (name, value))
+
+        def gauge(name, value, help_text):
+            lines.append('# HELP jeev_%s %s' % (name, help_text))
+            lines.append('# TYPE jeev_%s gauge' % name)
+            lines.append('jeev_%s %s' % (name, value))
+
+        counter('dispatch_queued_total', dispatcher['queued'], 'Messages handed to the dispatcher.')
+        counter('dispatch_dropped_total', dispatcher['dropped'], 'Messages dropped because the queue was full.')
+        counter('dispatch_processed_total', dispatcher['processed'], 'Messages handled by the dispatcher.')
+        gauge('dispatch_queue_depth', dispatcher['queue_depth'], 'Messages waiting to be handled.')
+        gauge('dispatch_busy_workers', dispatcher['busy_workers'], 'Dispatch workers handling a message.')
+        gauge('dispatch_lanes', dispatcher['lanes'], 'Channels with messages being handled in order.')
+
+        lines.append('# HELP jeev_module_greenlets Greenlets spawned by a module that are still running.')
+        lines.append('# TYPE jeev_module_greenlets gauge')
+        for module in self._jeev.modules._module_list:
+            lines.append('jeev_module_greenlets%s %d' % (_render_labels({'module': module.name}),
+                                                          len(module._running_greenlets)))
+
+        lines.append('# HELP jeev_dispatch_seconds Time spent handling a message.')
+        lines.append('# TYPE jeev_dispatch_seconds histogram')
+        _render_histogram(lines, 'jeev_dispatch_seconds', {}, self.dispatch_latency)
+
+        counter_names = set()
+        for (name, labels), value in sorted(self._counters.iteritems()):
+            if name not in counter_names:
+                counter_names.add(name)
+                lines.append('# TYPE jeev_%s counter' % name)
+
+            lines.append('jeev_%s%s %s' % (name, _render_labels(dict(labels)), value))
+
+        histogram_names = set()
+        for (name, labels), histogram in sorted(self._histograms.iteritems()):
+            if name not in histogram_names:
+                histogram_names.add(name)
+                lines.append('# TYPE jeev_%s histogram' % name)
+
+            _render_histogram(lines, 'jeev_%s' % name, dict(labels), histogram)
+
+        handler_stats = list(self.iter_handler_stats())
+        for metric, attr, help_text in (('handler_calls_total', 'calls', 'Calls to a module handler.'),
+                                        ('handler_errors_total', 'errors', 'Errors raised by a module handler.'),
+                                        ('handler_timeouts_total', 'timeouts', 'Module handler timeouts.')):
+            lines.append('# HELP jeev_%s %s' % (metric, help_text))
+            lines.append('# TYPE jeev_%s counter' % metric)
+            for module_name, stats in handler_stats:
+                lines.append('jeev_%s%s %d' % (metric, _render_labels({'module': module_name, 'handler': stats.name}),
+                                               getattr(stats, attr)))
+
+        lines.append('# HELP jeev_handler_seconds Time spent in a module handler.')
+        lines.append('# TYPE jeev_handler_seconds histogram')
+        for module_name, stats in handler_stats:
+            _render_histogram(lines, 'jeev_handler_seconds', {'module': module_name, 'handler': stats.name},
+                              stats.latency)
+
+        lines.append('# HELP jeev_handler_regex_seconds Time spent evaluating the regex of a module handler (sampled).')
+        lines.append('# TYPE jeev_handler_regex_seconds histogram')
+        for module_name, stats in handler_stats:
+            if stats.regex_latency is not None:
+                _render_histogram(lines, 'jeev_handler_regex_seconds', {'module': module_name, 'handler': stats.name},
+                                  stats.regex_latency)
+
+        lines.append('')
+        return '\n'.join(lines)
+
+
+def _escape(value):
+    return unicode(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _render_labels(labels):
+    if not labels:
+        return ''
+
+    return '{%s}' % ','.join('%s="%s"' % (k, _escape(v)) for k, v in sorted(labels.iteritems()))
+
+
+def _render_histogram(lines, name, labels, histogram):
+    cumulative = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        cumulative += count
+        lines.append('%s_bucket%s %d' % (name, _render_labels(dict(labels, le=repr(bound))), cumulative))
+
+    lines.append('%s_bucket%s %d' % (name, _render_labels(dict(labels, le='+Inf')), histogram.count))
+    lines.append('%s_sum%s %r' % (name, _render_labels(labels), histogram.sum))
+    lines.append('%s_count%s %d' % (name, _render_labels(labels), histogram.count))
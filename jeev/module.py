@@ -1,14 +1,18 @@
-from collections import defaultdict
+from collections import defaultdict, deque
 import bisect
 import functools
 import logging
 import re
 import gevent
 import sys
+import time
+from .metrics import HandlerStats
 from .utils.importing import import_first_matching_module, import_dotted_path
 from .utils.periodic import ModulePeriodic
+from .utils.regex_prefilter import RegexPrefilter, RegexMatcher
 from .utils.g import G
 from .utils.env import EnvFallbackDict
+from .events import _Event
 
 logger = logging.getLogger('jeev.module')
 _sentinel = object()
@@ -24,15 +28,76 @@ class Modules(object):
         self.jeev = jeev
         self._module_list = []
         self._module_dict = {}
+        # Maps a command word to the (module, [(priority, f, timeout), ...]) entries that should see a message starting
+        # with it, in load order. Modules that have listeners or regex listeners are included in every route, as they
+        # need to see every message regardless of the command word.
+        self._command_index = {}
+        self._passive_route = []
+        # Required literals of every regex listener, used to skip the regexes that can't match a message.
+        self._regex_prefilter = RegexPrefilter()
+        # Maps an event to the (module, [(priority, f, timeout), ...]) entries subscribed to it, in load order.
+        self._event_index = {}
 
     def _handle_message(self, message):
+        route = self._passive_route
+        if message.message_parts:
+            route = self._command_index.get(message.message_parts[0], route)
+
+        matcher = self._regex_prefilter.matcher(message.message)
+        for module, commands in route:
+            module._handle_message(message, commands, matcher)
+
+    def _handle_event(self, event, kwargs):
+        for module, handlers in self._event_index.get(event, ()):
+            module._queue_event(handlers, kwargs)
+
+    def _rebuild_dispatch_index(self):
+        """
+            Rebuilds the command index, regex prefilter and event index from the currently loaded modules. Called
+            whenever a module is loaded, unloaded, or registers a handler after it has been loaded.
+        """
+        command_index = {}
+        passive_route = []
+        regexes = []
+        event_index = {}
+
         for module in self._module_list:
-            module._handle_message(message)
+            regexes.extend(listener[1] for listener in module._regex_listeners)
+
+            for event, handlers in module._event_handlers.iteritems():
+                if handlers:
+                    event_index.setdefault(event, []).append((module, handlers))
+
+            if module._is_passive:
+                entry = (module, ())
+                passive_route.append(entry)
+
+                for route in command_index.itervalues():
+                    route.append(entry)
+
+            for command, commands in module._commands.iteritems():
+                if not commands:
+                    continue
+
+                if command not in command_index:
+                    command_index[command] = passive_route[:]
+
+                route = command_index[command]
+                if route and route[-1][0] is module:
+                    route[-1] = (module, commands)
+                else:
+                    route.append((module, commands))
+
+        self._command_index = command_index
+        self._passive_route = passive_route
+        self._regex_prefilter = RegexPrefilter(regexes)
+        self._event_index = event_index
 
     def _save_loaded_module_data(self):
         logger.info('Saving loaded module data')
-        for module in self._module_list:
-            module._save_data()
+        with self.jeev.metrics.histogram('storage_sync_seconds').time():
+            for module in self._module_list:
+                module._save_data()
 
     def _import_module(self, name, module_instance):
         def remove_from_sys_modules(module_name):
@@ -106,6 +171,7 @@ class Modules(object):
 
                 self._module_list.append(module_instance)
                 self._module_dict[module_name] = module_instance
+                self._rebuild_dispatch_index()
 
             logger.info("Loaded module %s", module_name)
 
@@ -138,6 +204,7 @@ class Modules(object):
         module._unload()
         del self._module_dict[module_name]
         self._module_list.remove(module)
+        self._rebuild_dispatch_index()
 
     def get_module(self, name, default=None):
         """
@@ -170,9 +237,15 @@ class Module(object):
 
     """
     STOP = object()
+    # Timing every regex search costs about as much as a prefiltered search itself, so the regex latency of the
+    # handlers is only measured on one in every `regex_timing_interval` messages.
+    regex_timing_interval = 16
+    # The most events that can be waiting to be handled by a module. Past this, the oldest ones are dropped.
+    event_queue_size = 1000
     __slots__ = ['jeev', 'opts', '_name', 'author', 'description', '_module_name',
                  '_commands', '_message_listeners', '_regex_listeners', '_loaded_callbacks', '_unload_callbacks',
-                 '_running_greenlets', '_data', '_app', '_g', '_opt_definitions']
+                 '_running_greenlets', '_data', '_app', '_g', '_opt_definitions', '_handler_timeout', '_handler_stats',
+                 '_event_handlers', '_messages_handled', '_event_queue', '_event_worker']
 
     def __init__(self, name, opts, author=None, description=None):
         self.author = author
@@ -186,12 +259,18 @@ class Module(object):
         self._commands = defaultdict(list)
         self._message_listeners = []
         self._regex_listeners = []
+        self._event_handlers = defaultdict(list)
         self._loaded_callbacks = []
         self._unload_callbacks = []
         self._running_greenlets = set()
         self._data = None
         self._app = None
         self._opt_definitions = None
+        self._handler_timeout = None
+        self._handler_stats = {}
+        self._messages_handled = 0
+        self._event_queue = deque()
+        self._event_worker = None
 
     def _unload(self):
         for callback in self._unload_callbacks:
@@ -201,6 +280,10 @@ class Module(object):
         self._loaded_callbacks[:] = []
         self._message_listeners[:] = []
         self._commands.clear()
+        self._event_handlers.clear()
+        self._event_queue.clear()
+        self._event_worker = None
+        self._handler_stats.clear()
         self._save_data(close=True)
         self._clean_g()
         self._app = None
@@ -214,6 +297,10 @@ class Module(object):
         self.jeev = modules.jeev
         self._validate_opts()
 
+        # The module's handler_timeout opt is the default timeout for its handlers, falling back to Jeev's.
+        handler_timeout = self.opts.get('handler_timeout', self.jeev._opts.get('handler_timeout'))
+        self._handler_timeout = float(handler_timeout) if handler_timeout else None
+
     def _loaded(self):
         for callback in self._loaded_callbacks:
             self._call_function(callback)
@@ -240,30 +327,87 @@ class Module(object):
             raise Module.ConfigError(error_dict)
 
     def _call_function(self, f, *args, **kwargs):
+        stats = self._handler_stats.get(f)
+        start = time.time()
         try:
             logger.debug("module %s calling %r with %r %r)", self._name, f, args, kwargs)
             return f(*args, **kwargs)
         except Exception, e:
+            if stats:
+                stats.errors += 1
+
             self._on_error(e)
+        finally:
+            if stats:
+                elapsed = time.time() - start
+                stats.calls += 1
+                stats.latency.observe(elapsed)
+                if stats.durations is not None:
+                    stats.durations.append(elapsed)
 
-    def _handle_message(self, message):
-        for _, f in self._message_listeners:
-            if self._call_function(f, message) is self.STOP:
+    def _call_handler(self, timeout, f, *args, **kwargs):
+        """
+            Calls a message handler, giving up on it if it hasn't returned after `timeout` seconds. If the timeout is
+            None, the module's default handler timeout is used.
+        """
+        if timeout is None:
+            timeout = self._handler_timeout
+
+        if not timeout:
+            return self._call_function(f, *args, **kwargs)
+
+        t = gevent.Timeout(timeout)
+        t.start()
+        try:
+            return self._call_function(f, *args, **kwargs)
+
+        except gevent.Timeout as e:
+            if e is not t:
+                raise
+
+            self._handler_stats[f].timeouts += 1
+            try:
+                raise Module.HandlerTimeout(f, timeout)
+            except Module.HandlerTimeout as e:
+                self._on_error(e)
+
+        finally:
+            t.cancel()
+
+    def _handle_message(self, message, commands=(), matcher=None):
+        """
+            Handles an incoming message. `commands` are the (priority, f, timeout) command handlers of this module that
+            matched the message's command word, as looked up by `Modules._handle_message` in the command index.
+            `matcher` is the RegexMatcher shared by all the modules handling the message.
+        """
+        if matcher is None:
+            matcher = RegexMatcher(message.message)
+
+        for _, f, timeout in self._message_listeners:
+            if self._call_handler(timeout, f, message) is self.STOP:
                 return
 
         if message.message_parts:
 
-            command = message.message_parts[0]
-            if command in self._commands:
-                for _, f in self._commands[command]:
-                    if self._call_function(f, message) is self.STOP:
-                        return
+            for _, f, timeout in commands:
+                if self._call_handler(timeout, f, message) is self.STOP:
+                    return
+
+            self._messages_handled += 1
+            timed = not self._messages_handled % self.regex_timing_interval
 
-            for _, regex, responder, f in self._regex_listeners:
+            for _, regex, responder, f, timeout in self._regex_listeners:
                 if responder and not message.targeting_jeev:
                     continue
 
-                match = regex.search(message.message)
+                if timed:
+                    start = time.time()
+                    match = matcher.search(regex)
+                    self._handler_stats[f].observe_regex(time.time() - start)
+
+                else:
+                    match = matcher.search(regex)
+
                 if match:
                     kwargs = match.groupdict()
 
@@ -272,9 +416,74 @@ class Module(object):
                     else:
                         args = match.groups()
 
-                    if self._call_function(f, message, *args, **kwargs) is self.STOP:
+                    if self._call_handler(timeout, f, message, *args, **kwargs) is self.STOP:
                         return
 
+    def _queue_event(self, handlers, kwargs):
+        """
+            Queues an event to be handled by the module. Events are handled one at a time, in order, by a single
+            greenlet per module, so that a burst of events (like the ones broadcast when the adapter reconnects) doesn't
+            spawn a greenlet per event.
+        """
+        if len(self._event_queue) >= self.event_queue_size:
+            self._event_queue.popleft()
+            self.jeev.metrics.incr('module_events_dropped_total', module=self._name)
+            logger.warning('Event queue of module %s is full, dropping its oldest event', self._name)
+
+        self._event_queue.append((handlers, kwargs))
+        if self._event_worker is None:
+            self._event_worker = self.spawn(self._handle_queued_events)
+
+    def _handle_queued_events(self):
+        queue = self._event_queue
+        try:
+            while queue:
+                self._handle_event(*queue.popleft())
+
+        finally:
+            self._event_worker = None
+
+    def _handle_event(self, handlers, kwargs):
+        """
+            Calls the (priority, f, timeout) handlers subscribed to an event, with the event's arguments.
+        """
+        for _, f, timeout in handlers:
+            if self._call_handler(timeout, f, **kwargs) is self.STOP:
+                return
+
+    @property
+    def _is_passive(self):
+        """
+            Returns True if the module needs to see every message, regardless of its command word.
+        """
+        return bool(self._message_listeners or self._regex_listeners)
+
+    def _add_handler_stats(self, f):
+        if f in self._handler_stats:
+            return
+
+        # The stats are labeled by the module and handler name in the metrics, so handlers that share a function name
+        # (like the ones defined in a loop) are numbered, in the order they were registered, to keep their labels
+        # unique.
+        name = getattr(f, '__name__', repr(f))
+        names = set(stats.name for stats in self._handler_stats.itervalues())
+        if name in names:
+            i = 2
+            while '%s#%d' % (name, i) in names:
+                i += 1
+
+            name = '%s#%d' % (name, i)
+
+        self._handler_stats[f] = HandlerStats(name)
+
+    def _handlers_changed(self):
+        """
+            Called when a handler is registered, so that the dispatch index can pick it up if the module has already
+            been loaded.
+        """
+        if self.jeev is not None:
+            self.jeev.modules._rebuild_dispatch_index()
+
     def _on_error(self, e):
         """
             Called when an error happens by something this module called.
@@ -394,58 +603,82 @@ class Module(object):
         self._unload_callbacks.append(f)
         return f
 
-    def command(self, command, priority=0):
+    def command(self, command, priority=0, timeout=None):
         """
             Register a command handler.
         """
 
         def bind_command(f):
-            bisect.insort(self._commands[command], (priority, f))
+            self._add_handler_stats(f)
+            bisect.insort(self._commands[command], (priority, f, timeout))
+            self._handlers_changed()
             return f
 
         return bind_command
 
-    def match(self, regex, flags=0, priority=0):
+    def match(self, regex, flags=0, priority=0, timeout=None):
         """
             Decorator that registers a function that will be called when Jeev sees a message that matches regex.
         """
         regex = re.compile(regex, flags)
 
         def bind_matcher(f):
-            bisect.insort(self._regex_listeners, (priority, regex, False, f))
+            self._add_handler_stats(f)
+            bisect.insort(self._regex_listeners, (priority, regex, False, f, timeout))
+            self._handlers_changed()
             return f
 
         return bind_matcher
 
-    def hear(self, regex, priority=0):
+    def hear(self, regex, priority=0, timeout=None):
         """
             Same as match, except case insensitive matching.
         """
-        return self.match(regex, re.I, priority)
+        return self.match(regex, re.I, priority, timeout)
 
-    def respond(self, regex, flags=re.I, priority=0):
+    def respond(self, regex, flags=re.I, priority=0, timeout=None):
         """
             Decorator that registers a function that will be called when any message directed at Jeev matches the regex.
         """
         regex = re.compile(regex, flags)
 
         def bind_matcher(f):
-            bisect.insort(self._regex_listeners, (priority, regex, True, f))
+            self._add_handler_stats(f)
+            bisect.insort(self._regex_listeners, (priority, regex, True, f, timeout))
+            self._handlers_changed()
             return f
 
         return bind_matcher
 
-    def listen(self, priority=0):
+    def listen(self, priority=0, timeout=None):
         """
             Decorator that registers a function that will be called any time Jeev sees a message.
         """
 
         def bind_listener(f):
-            bisect.insort(self._message_listeners, (priority, f))
+            self._add_handler_stats(f)
+            bisect.insort(self._message_listeners, (priority, f, timeout))
+            self._handlers_changed()
             return f
 
         return bind_listener
 
+    def on(self, event, priority=0, timeout=None):
+        """
+            Decorator that registers a function that will be called with the event's arguments whenever the adapter
+            broadcasts `event` (one of the events in `jeev.events`).
+        """
+        if not isinstance(event, _Event):
+            raise TypeError("%r is not an event from jeev.events." % (event,))
+
+        def bind_event_handler(f):
+            self._add_handler_stats(f)
+            bisect.insort(self._event_handlers[event], (priority, f, timeout))
+            self._handlers_changed()
+            return f
+
+        return bind_event_handler
+
     def async(self, sync_ret_val=None, timeout=0):
         """
             Decorator that will call the wrapped function inside a greenlet, and do some book-keeping to make
@@ -565,6 +798,16 @@ class Module(object):
 
             return '<ConfigError: %s, %s>' % (self.variable_name, self.error_message)
 
+    class HandlerTimeout(Exception):
+        """
+            Passed to `Jeev.on_module_error` when a message handler took longer than its timeout.
+        """
+
+        def __init__(self, handler, timeout):
+            super(Module.HandlerTimeout, self).__init__("Handler %r took longer than %.2f seconds" % (handler, timeout))
+            self.handler = handler
+            self.timeout = timeout
+
 
 class Opt(object):
     """
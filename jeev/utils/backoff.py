@@ -0,0 +1,22 @@
+import random
+
+
+class Backoff(object):
+    """
+        Jittered exponential backoff. Every call to `next` returns a random delay between 0 and `base * 2 ** attempts`
+        (capped at `max_delay`), so that clients that were disconnected at the same time don't all retry in lockstep.
+    """
+    __slots__ = ['base', 'max_delay', 'attempts']
+
+    def __init__(self, base=1, max_delay=60):
+        self.base = base
+        self.max_delay = max_delay
+        self.attempts = 0
+
+    def next(self):
+        delay = min(self.max_delay, self.base * 2 ** self.attempts)
+        self.attempts += 1
+        return random.uniform(0, delay)
+
+    def reset(self):
+        self.attempts = 0
@@ -0,0 +1,131 @@
+from collections import deque
+import logging
+import sys
+import time
+import traceback
+import gevent
+import greenlet
+from gevent import monkey
+from .periodic import Periodic
+
+logger = logging.getLogger('jeev.blocking')
+
+
+def _get_original(module_name, item_name):
+    """
+        Returns the un-monkeypatched version of module_name.item_name.
+    """
+    if hasattr(monkey, 'get_original'):
+        return monkey.get_original(module_name, item_name)
+
+    saved = monkey.saved.get(module_name, {})
+    if item_name in saved:
+        return saved[item_name]
+
+    return getattr(__import__(module_name), item_name)
+
+
+class BlockingDetector(object):
+    """
+        Detects when the gevent hub hasn't switched greenlets for longer than `threshold` seconds, which means that
+        something is blocking the whole process (CPU heavy work, or a call into a C extension that isn't cooperative).
+
+        Greenlet switches are tracked with `greenlet.settrace`, and a real OS thread checks on them periodically.
+        When the hub is blocked, the stack of the running greenlet is captured, along with the module and handler that
+        were running (if any). The reports are logged and counted in the `hub_blocked_total` metric from the hub, once
+        it is unblocked.
+    """
+
+    def __init__(self, jeev, threshold):
+        self._jeev = jeev
+        self._threshold = threshold
+        self._hub = None
+        self._thread_id = None
+        self._switches = 0
+        self._active = None
+        self._last_switch = time.time()
+        self._previous_trace = None
+        self._running = False
+        self._reports = deque()
+        self._report_periodic = Periodic(1, self._log_reports)
+
+    def _trace(self, event, args):
+        if event in ('switch', 'throw'):
+            self._switches += 1
+            self._active = args[1]
+            self._last_switch = time.time()
+
+        if self._previous_trace:
+            self._previous_trace(event, args)
+
+    def start(self):
+        if self._running:
+            raise RuntimeError("BlockingDetector already started.")
+
+        logger.info("Starting blocking detector with a threshold of %.3f seconds", self._threshold)
+        self._hub = gevent.get_hub()
+        self._thread_id = _get_original('thread', 'get_ident')()
+        self._previous_trace = greenlet.settrace(self._trace)
+        self._running = True
+        _get_original('thread', 'start_new_thread')(self._monitor, ())
+        self._report_periodic.start(right_away=False)
+
+    def stop(self):
+        if not self._running:
+            return
+
+        self._running = False
+        greenlet.settrace(self._previous_trace)
+        self._previous_trace = None
+        self._report_periodic.stop()
+        self._log_reports()
+
+    def _monitor(self):
+        sleep = _get_original('time', 'sleep')
+        reported_switch = None
+
+        while self._running:
+            sleep(self._threshold / 2)
+
+            switches = self._switches
+            active = self._active
+            if switches == reported_switch or active is None or active is self._hub:
+                continue
+
+            blocked_for = time.time() - self._last_switch
+            if blocked_for < self._threshold:
+                continue
+
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None or switches != self._switches:
+                continue
+
+            reported_switch = switches
+            module, handler = _find_handler(frame)
+            self._reports.append((blocked_for, module, handler, ''.join(traceback.format_stack(frame))))
+
+    def _log_reports(self):
+        while self._reports:
+            blocked_for, module, handler, stack = self._reports.popleft()
+            self._jeev.metrics.incr('hub_blocked_total', module=module or '')
+            logger.warning("The hub was blocked for at least %.3f seconds (module: %s, handler: %s):\n%s",
+                           blocked_for, module, handler, stack)
+
+
+def _find_handler(frame):
+    """
+        Walks up the stack to find the module and handler being called by `Module._call_function`, if any.
+    """
+    from ..module import Module
+
+    call_function_code = Module._call_function.__func__.__code__
+    while frame is not None:
+        if frame.f_code is call_function_code:
+            f_locals = frame.f_locals
+            module = f_locals.get('self')
+            handler = f_locals.get('f')
+            return getattr(module, 'name', None), getattr(handler, '__name__', repr(handler))
+
+        frame = frame.f_back
+
+    return None, None
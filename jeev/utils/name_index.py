@@ -0,0 +1,69 @@
+from bisect import bisect_left, insort
+
+
+class NameIndex(object):
+    """
+        Indexes objects by name, case-insensitively. Along with the name -> objects mapping, the names are kept sorted,
+        so that all the names starting with a prefix can be found with a binary search, instead of a scan.
+
+        Names whose last object is removed are dropped from the index right away.
+    """
+    __slots__ = ['_objects_by_name', '_sorted_names']
+
+    def __init__(self):
+        self._objects_by_name = {}
+        self._sorted_names = []
+
+    def add(self, name, obj):
+        name = name.lower()
+        objects = self._objects_by_name.get(name)
+        if objects is None:
+            objects = self._objects_by_name[name] = set()
+            insort(self._sorted_names, name)
+
+        objects.add(obj)
+
+    def discard(self, name, obj):
+        name = name.lower()
+        objects = self._objects_by_name.get(name)
+        if objects is None:
+            return
+
+        objects.discard(obj)
+        if not objects:
+            del self._objects_by_name[name]
+            del self._sorted_names[bisect_left(self._sorted_names, name)]
+
+    def clear(self):
+        self._objects_by_name.clear()
+        del self._sorted_names[:]
+
+    def get(self, name):
+        """
+            Returns one of the objects with the name, or None if there are none.
+        """
+        objects = self._objects_by_name.get(name.lower())
+        if objects:
+            return next(iter(objects))
+
+    def iter_prefix(self, prefix):
+        """
+            Yields the (name, objects) of every name that starts with `prefix`, in order.
+        """
+        prefix = prefix.lower()
+        names = self._sorted_names
+        for i in xrange(bisect_left(names, prefix), len(names)):
+            name = names[i]
+            if not name.startswith(prefix):
+                break
+
+            yield name, self._objects_by_name[name]
+
+    def names(self):
+        return list(self._sorted_names)
+
+    def __contains__(self, name):
+        return name.lower() in self._objects_by_name
+
+    def __len__(self):
+        return len(self._sorted_names)
@@ -0,0 +1,119 @@
+import sre_constants
+import sre_parse
+
+# The shortest literal worth prefiltering on. Shorter literals appear in almost every message, so checking for them
+# costs more than just running the regex.
+MIN_LITERAL_LENGTH = 3
+
+
+def required_literal(regex):
+    """
+        Returns the longest lowercased literal substring that any string matched by `regex` must contain, or None if
+        no such literal (of at least MIN_LITERAL_LENGTH characters) could be found.
+
+        >>> required_literal(re.compile('countdown for (\d+) seconds'))
+        'countdown for '
+        >>> required_literal(re.compile('(foo|bar) baz'))
+        ' baz'
+        >>> print required_literal(re.compile('foo|bar'))
+        None
+    """
+    try:
+        parsed = sre_parse.parse(regex.pattern, regex.flags)
+    except (sre_constants.error, TypeError):
+        return None
+
+    runs = []
+    run = []
+
+    def end_run():
+        if run:
+            runs.append(''.join(run))
+            del run[:]
+
+    def walk(items):
+        for op, av in items:
+            if op == sre_constants.LITERAL and av < 128:
+                run.append(chr(av).lower())
+
+            elif op == sre_constants.AT:
+                # Anchors are zero-width, so the literals on either side of them are still adjacent.
+                continue
+
+            elif op == sre_constants.SUBPATTERN:
+                # The last element of a subpattern is its contents, regardless of the version of sre_parse.
+                walk(av[-1])
+
+            else:
+                end_run()
+
+    walk(parsed)
+    end_run()
+
+    literal = max(runs, key=len) if runs else None
+    if literal and len(literal) >= MIN_LITERAL_LENGTH:
+        return literal
+
+
+class RegexPrefilter(object):
+    """
+        Holds the required literal of each of a set of regexes, so that a regex whose literal does not appear in a
+        message can be skipped with a substring check, instead of being run.
+    """
+    __slots__ = ['_entries']
+
+    def __init__(self, regexes=()):
+        # regex -> (canonical regex, required literal). Regexes with the same pattern and flags share a canonical
+        # regex, which their search results are memoized under.
+        self._entries = {}
+        canonical = {}
+
+        for regex in regexes:
+            if regex in self._entries:
+                continue
+
+            key = regex.pattern, regex.flags
+            entry = canonical.get(key)
+            if entry is None:
+                entry = canonical[key] = regex, required_literal(regex)
+
+            self._entries[regex] = entry
+
+    def matcher(self, text):
+        """
+            Returns a RegexMatcher that can be used to search text for any number of regexes.
+        """
+        return RegexMatcher(text, self)
+
+
+_MISSING = object()
+
+
+class RegexMatcher(object):
+    """
+        Searches a single message for regexes, skipping the regexes whose required literal does not appear in it, and
+        memoizing the results, so that a regex registered by multiple modules is only run once per message.
+    """
+    __slots__ = ['text', '_entries', '_lowered', '_results']
+
+    def __init__(self, text, prefilter=None):
+        self.text = text
+        self._entries = prefilter._entries if prefilter else {}
+        self._lowered = None
+        self._results = {}
+
+    def search(self, regex):
+        regex, literal = self._entries.get(regex) or (regex, None)
+        if literal is not None:
+            lowered = self._lowered
+            if lowered is None:
+                lowered = self._lowered = self.text.lower()
+
+            if literal not in lowered:
+                return None
+
+        result = self._results.get(regex, _MISSING)
+        if result is _MISSING:
+            result = self._results[regex] = regex.search(self.text)
+
+        return result
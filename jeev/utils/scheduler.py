@@ -0,0 +1,191 @@
+from collections import deque
+import logging
+import time
+from gevent import Greenlet, sleep
+from gevent.event import Event
+
+logger = logging.getLogger('jeev.utils.scheduler')
+
+
+class TokenBucket(object):
+    """
+        Allows `rate` operations per second on average, with bursts of up to `capacity` operations.
+    """
+    __slots__ = ['rate', 'capacity', 'tokens', 'updated_at']
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.time()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def consume(self, now):
+        """
+            Takes a token from the bucket if there is one, returning whether there was.
+        """
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+
+        return False
+
+    def wait_time(self, now):
+        """
+            How long until the next token is available.
+        """
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0
+
+        return (1 - self.tokens) / self.rate
+
+    def full(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _KeyQueue(object):
+    __slots__ = ['bucket', 'priority', 'normal', 'scheduled']
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.priority = deque()
+        self.normal = deque()
+        self.scheduled = False
+
+    def __len__(self):
+        return len(self.priority) + len(self.normal)
+
+
+class RateLimitedScheduler(object):
+    """
+        Sends queued items through `send`, at most `rate` items per second per key (with bursts of up to `burst`
+        items), going round-robin across the keys that have items waiting, so that a busy key can't starve the others.
+        Items scheduled with priority=True are sent before the other items of their key.
+
+        `on_sent`, if given, is called with how long each item waited in the queue.
+
+        Sending can be paused (while whatever items are sent through is unavailable), in which case items keep being
+        queued, and are sent once it's resumed.
+    """
+
+    def __init__(self, send, rate=1.0, burst=3, on_sent=None):
+        self._send = send
+        self._rate = rate
+        self._burst = burst
+        self._on_sent = on_sent
+        self._queues = {}
+        self._ready = deque()
+        self._wakeup = Event()
+        self._resumed = Event()
+        self._resumed.set()
+        self._greenlet = None
+        self.queue_depth = 0
+
+    def start(self):
+        if self._greenlet:
+            raise RuntimeError("RateLimitedScheduler already started.")
+
+        self._greenlet = Greenlet(self._run)
+        self._greenlet.start()
+
+    def stop(self):
+        if self._greenlet:
+            self._greenlet.kill()
+            self._greenlet = None
+
+    def pause(self):
+        self._resumed.clear()
+
+    def resume(self):
+        self._resumed.set()
+
+    def iter_items(self):
+        """
+            Yields the items waiting to be sent.
+        """
+        for queue in self._queues.itervalues():
+            for _, item in queue.priority:
+                yield item
+
+            for _, item in queue.normal:
+                yield item
+
+    def schedule(self, key, item, priority=False):
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = _KeyQueue(TokenBucket(self._rate, self._burst))
+
+        (queue.priority if priority else queue.normal).append((time.time(), item))
+        self.queue_depth += 1
+
+        if not queue.scheduled:
+            queue.scheduled = True
+            self._ready.append(key)
+
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._resumed.wait()
+            if not self._ready:
+                self._forget_idle_keys()
+                self._wakeup.clear()
+                self._wakeup.wait()
+                continue
+
+            now = time.time()
+            sent = False
+            wait = None
+
+            for _ in xrange(len(self._ready)):
+                if not self._resumed.is_set():
+                    break
+
+                key = self._ready.popleft()
+                queue = self._queues[key]
+
+                if queue.bucket.consume(now):
+                    queued_at, item = (queue.priority or queue.normal).popleft()
+                    self.queue_depth -= 1
+                    sent = True
+                    self._send_item(item, now - queued_at)
+
+                else:
+                    key_wait = queue.bucket.wait_time(now)
+                    wait = key_wait if wait is None else min(wait, key_wait)
+
+                if queue:
+                    self._ready.append(key)
+
+                else:
+                    queue.scheduled = False
+
+            if sent:
+                sleep(0)
+
+            elif wait is not None:
+                self._wakeup.clear()
+                self._wakeup.wait(wait)
+
+    def _forget_idle_keys(self):
+        # A key can only be forgotten once its bucket is full again, otherwise its rate limit would be reset.
+        now = time.time()
+        for key, queue in self._queues.items():
+            if not queue.scheduled and queue.bucket.full(now):
+                del self._queues[key]
+
+    def _send_item(self, item, delay):
+        try:
+            self._send(item)
+
+        except Exception:
+            logger.exception("Error sending %r", item)
+
+        if self._on_sent:
+            self._on_sent(delay)
@@ -10,8 +10,11 @@ class Web(object):
     """
         Jeev's WSGI server. Routes requests to their appropriate module. See `jeev.module.Module.app` for more
         details.
+
+        Requests to `/_jeev/...` are reserved for Jeev itself, and are never routed to modules.
     """
     _url_map = Map([
+        Rule('/_jeev/metrics', endpoint='metrics'),
         Rule('/<module>/', endpoint='module', defaults={'rest': ''}),
         Rule('/<module>/<path:rest>', endpoint='module')
     ])
@@ -43,6 +46,12 @@ class Web(object):
 
         return NotFound()(environ, start_response)
 
+    def _handle_metrics(self, args, environ, start_response):
+        body = self._jeev.metrics.render_prometheus().encode('utf8')
+        start_response('200 OK', [('Content-Type', 'text/plain; version=0.0.4; charset=utf-8'),
+                                  ('Content-Length', str(len(body)))])
+        return [body]
+
     def start(self):
         logger.info("Starting web server on %s:%s", *self._bind_addr)
         self._server.start()
@@ -16,7 +16,7 @@ setup(
     license="MIT",
     keywords="chat slack bot irc jeev",
     url="https://github.com/jhgg/jeev",
-    packages=find_packages(exclude=['modules']),
+    packages=find_packages(exclude=['modules', 'tests']),
     install_requires=[
         'certifi==14.5.14',
         'coloredlogs==1.0.1',
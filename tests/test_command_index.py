@@ -0,0 +1,81 @@
+import unittest
+from tests.utils import FakeJeev, add_module, make_message
+
+
+class CommandIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.jeev = FakeJeev()
+        self.calls = []
+
+    def handler(self, name):
+        def f(message, *args):
+            self.calls.append(name)
+
+        f.__name__ = name
+        return f
+
+    def handle(self, text):
+        del self.calls[:]
+        self.jeev.modules._handle_message(make_message(self.jeev, text))
+        return self.calls
+
+    def test_commands_are_routed_by_their_first_word(self):
+        a = add_module(self.jeev, 'a')
+        b = add_module(self.jeev, 'b')
+        a.command('!ping')(self.handler('a.ping'))
+        b.command('!pong')(self.handler('b.pong'))
+
+        self.assertEqual(self.handle('!ping'), ['a.ping'])
+        self.assertEqual(self.handle('!pong now'), ['b.pong'])
+        self.assertEqual(self.handle('ping !ping'), [])
+        self.assertEqual(self.handle(''), [])
+
+    def test_passive_modules_see_every_message_in_load_order(self):
+        a = add_module(self.jeev, 'a')
+        b = add_module(self.jeev, 'b')
+        c = add_module(self.jeev, 'c')
+        a.listen()(self.handler('a.listen'))
+        b.command('!ping')(self.handler('b.ping'))
+        c.hear('ping')(self.handler('c.hear'))
+
+        self.assertEqual(self.handle('!ping'), ['a.listen', 'b.ping', 'c.hear'])
+        self.assertEqual(self.handle('ping'), ['a.listen', 'c.hear'])
+        self.assertEqual(self.handle('!other'), ['a.listen'])
+
+    def test_commands_of_a_module_run_in_priority_order(self):
+        a = add_module(self.jeev, 'a')
+        a.command('!ping', priority=2)(self.handler('last'))
+        a.command('!ping', priority=1)(self.handler('first'))
+
+        self.assertEqual(self.handle('!ping'), ['first', 'last'])
+
+    def test_stop_skips_the_module_s_remaining_handlers(self):
+        a = add_module(self.jeev, 'a')
+        b = add_module(self.jeev, 'b')
+
+        @a.command('!ping', priority=0)
+        def stop(message):
+            self.calls.append('a.stop')
+            return a.STOP
+
+        a.command('!ping', priority=1)(self.handler('a.skipped'))
+        b.command('!ping')(self.handler('b.ping'))
+
+        self.assertEqual(self.handle('!ping'), ['a.stop', 'b.ping'])
+
+    def test_index_follows_loads_and_unloads(self):
+        a = add_module(self.jeev, 'a')
+        a.command('!ping')(self.handler('a.ping'))
+        self.assertEqual(self.handle('!ping'), ['a.ping'])
+
+        # A handler registered after the module was loaded is indexed right away.
+        a.command('!late')(self.handler('a.late'))
+        self.assertEqual(self.handle('!late'), ['a.late'])
+
+        self.jeev.modules.unload('a')
+        self.assertEqual(self.handle('!ping'), [])
+        self.assertEqual(self.jeev.modules._command_index, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,251 @@
+import unittest
+import gevent
+from gevent.event import Event
+from jeev.dispatch import Dispatcher
+
+
+class FakeMessage(object):
+    def __init__(self, channel, text):
+        self.channel = channel
+        self.text = text
+
+    def __repr__(self):
+        return '<FakeMessage %s: %s>' % (self.channel, self.text)
+
+
+class BlockingHandler(object):
+    """
+        A message handler that doesn't return until it's released, recording the messages it handled.
+    """
+
+    def __init__(self):
+        self.started = []
+        self.handled = []
+        self.release = Event()
+
+    def __call__(self, message):
+        self.started.append(message)
+        self.release.wait()
+        self.handled.append(message)
+
+
+class DispatcherTestCase(unittest.TestCase):
+    def make_dispatcher(self, **kwargs):
+        self.handler = BlockingHandler()
+        dispatcher = Dispatcher(self.handler, **kwargs)
+        dispatcher.start()
+        self.addCleanup(dispatcher.stop)
+        return dispatcher
+
+    def dispatch(self, dispatcher, channel, count):
+        messages = []
+        for i in xrange(count):
+            message = FakeMessage(channel, i)
+            dispatcher.dispatch(message)
+            messages.append(message)
+            gevent.sleep(0)
+
+        return messages
+
+    def assert_dispatch_does_not_block(self, dispatcher, message):
+        with gevent.Timeout(1, AssertionError('dispatch blocked')):
+            dispatcher.dispatch(message)
+
+
+class OverflowTest(DispatcherTestCase):
+    """
+        The overflow policies in `concurrent` mode, with a single worker stuck on the first message so that the rest
+        pile up in the queue.
+    """
+
+    def test_drop_oldest(self):
+        dispatcher = self.make_dispatcher(pool_size=1, queue_size=2, overflow='drop_oldest')
+        messages = self.dispatch(dispatcher, 'C1', 5)
+        self.assertEqual(self.handler.started, messages[:1])
+        self.assertEqual(dispatcher.dropped, 2)
+        self.assertEqual(dispatcher.queue_depth, 2)
+
+        self.handler.release.set()
+        gevent.sleep(0.01)
+        self.assertEqual(self.handler.handled, [messages[0]] + messages[3:])
+        self.assertEqual(dispatcher.processed, 3)
+
+    def test_drop_low_priority(self):
+        dispatcher = self.make_dispatcher(pool_size=1, queue_size=2, overflow='drop_low_priority',
+                                          low_priority_channels=['c1'])
+        self.dispatch(dispatcher, 'C1', 4)
+        # The queue is full, so new low priority messages are dropped...
+        self.assertEqual(dispatcher.dropped, 1)
+
+        # ...and other messages replace the oldest queued low priority message.
+        high = self.dispatch(dispatcher, 'C2', 2)
+        self.assertEqual(dispatcher.dropped, 3)
+
+        # With no low priority messages left to drop, the caller waits for room in the queue.
+        blocked = gevent.spawn(dispatcher.dispatch, FakeMessage('C2', 'blocked'))
+        gevent.sleep(0.01)
+        self.assertFalse(blocked.ready())
+
+        self.handler.release.set()
+        blocked.join(1)
+        gevent.sleep(0.01)
+        self.assertEqual([(m.channel, m.text) for m in self.handler.handled],
+                         [('C1', 0)] + [('C2', m.text) for m in high] + [('C2', 'blocked')])
+
+    def test_block(self):
+        dispatcher = self.make_dispatcher(pool_size=1, queue_size=2, overflow='block')
+        messages = self.dispatch(dispatcher, 'C1', 3)
+
+        blocked = gevent.spawn(dispatcher.dispatch, FakeMessage('C1', 3))
+        gevent.sleep(0.01)
+        self.assertFalse(blocked.ready())
+        self.assertEqual(dispatcher.queue_depth, 2)
+
+        self.handler.release.set()
+        blocked.join(1)
+        self.assertTrue(blocked.ready())
+        gevent.sleep(0.01)
+        self.assertEqual([m.text for m in self.handler.handled], [0, 1, 2, 3])
+        self.assertEqual(self.handler.handled[:3], messages)
+        self.assertEqual(dispatcher.dropped, 0)
+
+    def test_no_pool(self):
+        dispatcher = self.make_dispatcher(pool_size=0, queue_size=2, overflow='block')
+        messages = [FakeMessage('C1', i) for i in xrange(5)]
+        for message in messages:
+            self.assert_dispatch_does_not_block(dispatcher, message)
+
+        # Every message gets its own greenlet, regardless of the queue size.
+        gevent.sleep(0)
+        self.assertEqual(self.handler.started, messages)
+
+        self.handler.release.set()
+        gevent.sleep(0.01)
+        self.assertEqual(self.handler.handled, messages)
+        self.assertEqual(dispatcher.processed, 5)
+
+    def test_handler_errors_do_not_kill_workers(self):
+        handled = []
+
+        def handler(message):
+            handled.append(message)
+            raise ValueError(message)
+
+        dispatcher = Dispatcher(handler, pool_size=1, queue_size=2)
+        dispatcher.start()
+        self.addCleanup(dispatcher.stop)
+
+        messages = self.dispatch(dispatcher, 'C1', 3)
+        gevent.sleep(0.01)
+        self.assertEqual(handled, messages)
+        self.assertEqual(dispatcher.processed, 3)
+
+
+class ChannelOrderTest(DispatcherTestCase):
+    def test_channel_messages_are_handled_in_order(self):
+        dispatcher = self.make_dispatcher(pool_size=3, queue_size=10, mode='channel')
+        first = self.dispatch(dispatcher, 'C1', 3)
+        second = self.dispatch(dispatcher, 'C2', 2)
+
+        # Each channel has a single message being handled at a time, the rest waiting in its lane, and the third
+        # worker stays idle.
+        self.assertEqual(self.handler.started, [first[0], second[0]])
+        self.assertEqual(dispatcher.stats()['lanes'], 2)
+        self.assertEqual(dispatcher.queue_depth, 3)
+
+        self.handler.release.set()
+        gevent.sleep(0.01)
+        self.assertEqual([m for m in self.handler.handled if m.channel == 'C1'], first)
+        self.assertEqual([m for m in self.handler.handled if m.channel == 'C2'], second)
+        self.assertEqual(dispatcher._lanes, {})
+        self.assertEqual(dispatcher._slots.counter, 10)
+
+    def test_concurrent_mode_does_not_order_messages(self):
+        dispatcher = self.make_dispatcher(pool_size=3, queue_size=10)
+        messages = self.dispatch(dispatcher, 'C1', 3)
+        self.assertEqual(self.handler.started, messages)
+
+
+class ChannelFloodTest(DispatcherTestCase):
+    """
+        A single channel flooding the dispatcher in `channel` mode fills up the queue with messages waiting in its lane,
+        which must not keep the other channels from being handled by the idle workers.
+    """
+
+    def test_drop_oldest(self):
+        dispatcher = self.make_dispatcher(pool_size=2, queue_size=5, overflow='drop_oldest', mode='channel')
+        flood = self.dispatch(dispatcher, 'C1', 10)
+        self.assertEqual(len(dispatcher._lanes['C1']), 5)
+
+        other = FakeMessage('C2', 'hi')
+        self.assert_dispatch_does_not_block(dispatcher, other)
+        gevent.sleep(0)
+        self.assertEqual(self.handler.started, [flood[0], other])
+        self.assertEqual(dispatcher.dropped, 5)
+
+        self.handler.release.set()
+        gevent.sleep(0.01)
+        # The oldest messages of the flood were dropped, the latest ones are handled in order.
+        self.assertEqual(self.handler.handled, [flood[0], other] + flood[6:])
+        self.assertEqual(dispatcher.queue_depth, 0)
+
+    def test_drop_low_priority(self):
+        dispatcher = self.make_dispatcher(pool_size=2, queue_size=5, overflow='drop_low_priority', mode='channel',
+                                          low_priority_channels=['C1'])
+        flood = self.dispatch(dispatcher, 'C1', 10)
+        self.assertEqual(dispatcher.dropped, 4)
+
+        other = FakeMessage('C2', 'hi')
+        self.assert_dispatch_does_not_block(dispatcher, other)
+        gevent.sleep(0)
+        self.assertEqual(self.handler.started, [flood[0], other])
+
+        self.handler.release.set()
+        gevent.sleep(0.01)
+        self.assertEqual(self.handler.handled, [flood[0], other] + flood[2:6])
+
+    def test_block(self):
+        dispatcher = self.make_dispatcher(pool_size=2, queue_size=5, overflow='block', mode='channel')
+        flood = self.dispatch(dispatcher, 'C1', 6)
+
+        # The queue is full, so the adapter waits, but only until the channel's next message is handled.
+        other = FakeMessage('C2', 'hi')
+        blocked = gevent.spawn(dispatcher.dispatch, other)
+        gevent.sleep(0.01)
+        self.assertFalse(blocked.ready())
+
+        self.handler.release.set()
+        blocked.join(1)
+        self.assertTrue(blocked.ready())
+        gevent.sleep(0.01)
+        self.assertEqual(sorted(self.handler.handled), sorted(flood + [other]))
+        self.assertEqual(dispatcher.dropped, 0)
+
+
+class RestartTest(DispatcherTestCase):
+    def test_restart_after_stop(self):
+        dispatcher = self.make_dispatcher(pool_size=1, queue_size=3, overflow='block', mode='channel')
+        self.dispatch(dispatcher, 'C1', 3)
+        self.dispatch(dispatcher, 'C2', 1)
+        blocked = gevent.spawn(dispatcher.dispatch, FakeMessage('C3', 'blocked'))
+        gevent.sleep(0)
+
+        dispatcher.stop()
+        # Stopping wakes up the blocked dispatch, whose message is queued for the next start.
+        blocked.join(1)
+        self.assertTrue(blocked.ready())
+        self.assertEqual(dispatcher.dropped, 3)
+        self.assertEqual(dispatcher.queue_depth, 1)
+
+        self.handler.release.set()
+        dispatcher.start()
+        messages = self.dispatch(dispatcher, 'C1', 3)
+        gevent.sleep(0.01)
+        self.assertEqual([m.text for m in self.handler.handled], ['blocked', 0, 1, 2])
+        self.assertEqual(self.handler.handled[1:], messages)
+        self.assertEqual(dispatcher.queue_depth, 0)
+        self.assertEqual(dispatcher._slots.counter, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
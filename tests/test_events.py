@@ -0,0 +1,117 @@
+import unittest
+import gevent
+from gevent.event import Event
+from jeev import events
+from jeev.module import Module
+from tests.utils import FakeJeev, add_module
+
+
+class EventBusTest(unittest.TestCase):
+    def setUp(self):
+        self.jeev = FakeJeev()
+        self.calls = []
+
+    def handler(self, name):
+        def f(**kwargs):
+            self.calls.append((name, kwargs))
+
+        f.__name__ = name
+        return f
+
+    def broadcast(self, event, **kwargs):
+        self.jeev._handle_event(event, **kwargs)
+        gevent.sleep(0)
+        return [name for name, _ in self.calls]
+
+    def test_only_subscribed_modules_get_the_event(self):
+        a = add_module(self.jeev, 'a')
+        b = add_module(self.jeev, 'b')
+        add_module(self.jeev, 'c')
+        a.on(events.Channel.Joined)(self.handler('a.joined'))
+        b.on(events.Channel.Left)(self.handler('b.left'))
+
+        self.assertEqual(self.broadcast(events.Channel.Joined, channel='C1'), ['a.joined'])
+        self.assertEqual(self.calls[0][1], {'channel': 'C1'})
+        self.assertEqual(self.broadcast(events.Team.Joined, user='U1'), ['a.joined'])
+
+    def test_handlers_run_in_priority_order(self):
+        a = add_module(self.jeev, 'a')
+        a.on(events.Channel.Joined, priority=2)(self.handler('last'))
+        a.on(events.Channel.Joined, priority=1)(self.handler('first'))
+
+        self.assertEqual(self.broadcast(events.Channel.Joined, channel='C1'), ['first', 'last'])
+
+    def test_stop_skips_the_remaining_handlers(self):
+        a = add_module(self.jeev, 'a')
+
+        @a.on(events.Channel.Joined, priority=0)
+        def stop(**kwargs):
+            self.calls.append(('stop', kwargs))
+            return a.STOP
+
+        a.on(events.Channel.Joined, priority=1)(self.handler('skipped'))
+        self.assertEqual(self.broadcast(events.Channel.Joined, channel='C1'), ['stop'])
+
+    def test_events_are_handled_in_order_one_at_a_time(self):
+        a = add_module(self.jeev, 'a')
+        release = Event()
+
+        @a.on(events.Channel.Joined)
+        def joined(channel):
+            self.calls.append(('started', channel))
+            release.wait()
+            self.calls.append(('done', channel))
+
+        for channel in 'C1', 'C2', 'C3':
+            self.jeev._handle_event(events.Channel.Joined, channel=channel)
+
+        gevent.sleep(0)
+        self.assertEqual(self.calls, [('started', 'C1')])
+
+        release.set()
+        gevent.sleep(0.01)
+        self.assertEqual(self.calls, [('started', 'C1'), ('done', 'C1'), ('started', 'C2'), ('done', 'C2'),
+                                      ('started', 'C3'), ('done', 'C3')])
+        self.assertIsNone(a._event_worker)
+
+    def test_full_queue_drops_the_oldest_events(self):
+        self.addCleanup(setattr, Module, 'event_queue_size', Module.event_queue_size)
+        Module.event_queue_size = 2
+        a = add_module(self.jeev, 'a')
+        a.on(events.Channel.Joined)(self.handler('joined'))
+
+        for channel in 'C1', 'C2', 'C3', 'C4':
+            self.jeev._handle_event(events.Channel.Joined, channel=channel)
+
+        gevent.sleep(0)
+        self.assertEqual([kwargs['channel'] for _, kwargs in self.calls], ['C3', 'C4'])
+        self.assertEqual(self.jeev.metrics.counters[('module_events_dropped_total', (('module', 'a'),))], 2)
+
+    def test_handler_errors_are_reported(self):
+        a = add_module(self.jeev, 'a')
+
+        @a.on(events.Channel.Joined)
+        def fails(channel):
+            raise ValueError(channel)
+
+        a.on(events.Channel.Joined, priority=1)(self.handler('after'))
+        # The error doesn't keep the module's other handlers from seeing the event.
+        self.assertEqual(self.broadcast(events.Channel.Joined, channel='C1'), ['after'])
+        self.assertEqual([(name, type(e)) for name, e in self.jeev.errors], [('a', ValueError)])
+
+    def test_index_follows_unloads(self):
+        a = add_module(self.jeev, 'a')
+        a.on(events.Channel.Joined)(self.handler('joined'))
+
+        self.jeev.modules.unload('a')
+        self.assertEqual(self.broadcast(events.Channel.Joined, channel='C1'), [])
+        self.assertEqual(self.jeev.modules._event_index, {})
+
+    def test_on_rejects_anything_but_events(self):
+        a = add_module(self.jeev, 'a')
+        self.assertRaises(TypeError, a.on, 'channel_joined')
+        self.assertRaises(TypeError, a.on, events.Channel)
+
+
+if __name__ == '__main__':
+    unittest.main()
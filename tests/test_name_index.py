@@ -0,0 +1,101 @@
+import unittest
+from jeev.adapter.slack import SlackAdapter
+from jeev.utils.name_index import NameIndex
+
+
+class NameIndexTest(unittest.TestCase):
+    def test_names_are_case_insensitive(self):
+        index = NameIndex()
+        index.add('Alice', 1)
+
+        self.assertEqual(index.get('alice'), 1)
+        self.assertEqual(index.get('ALICE'), 1)
+        self.assertIn('aLiCe', index)
+        self.assertIsNone(index.get('bob'))
+        self.assertEqual(index.names(), ['alice'])
+
+    def test_discard(self):
+        index = NameIndex()
+        index.add('alice', 1)
+        index.add('Alice', 2)
+        self.assertEqual(len(index), 1)
+
+        index.discard('ALICE', 1)
+        self.assertEqual(index.get('alice'), 2)
+
+        # The name is dropped along with its last object.
+        index.discard('alice', 2)
+        self.assertNotIn('alice', index)
+        self.assertEqual(index.names(), [])
+
+        # Discarding what isn't there does nothing.
+        index.discard('alice', 2)
+        index.discard('bob', 1)
+        self.assertEqual(len(index), 0)
+
+    def test_iter_prefix(self):
+        index = NameIndex()
+        for i, name in enumerate(['joe', 'Jon', 'john', 'jo', 'bob', 'jp', 'zed']):
+            index.add(name, i)
+
+        index.add('JOHN', 7)
+        self.assertEqual(list(index.iter_prefix('Jo')), [
+            ('jo', set([3])),
+            ('joe', set([0])),
+            ('john', set([2, 7])),
+            ('jon', set([1])),
+        ])
+        self.assertEqual([name for name, _ in index.iter_prefix('')], index.names())
+        self.assertEqual(list(index.iter_prefix('zz')), [])
+        self.assertEqual(list(index.iter_prefix('a')), [])
+
+    def test_clear(self):
+        index = NameIndex()
+        index.add('alice', 1)
+        index.clear()
+
+        self.assertEqual(len(index), 0)
+        self.assertEqual(list(index.iter_prefix('a')), [])
+
+
+class SlackObjectListTest(unittest.TestCase):
+    def setUp(self):
+        self.users = SlackAdapter.SlackObjectList()
+        self.alice = SlackAdapter.SlackUser({'id': 'U1', 'name': 'alice', 'real_name': 'Alice Jones'})
+        self.john = SlackAdapter.SlackUser({'id': 'U2', 'name': 'john', 'profile': {'display_name': 'Johnny'}})
+        self.users.add(self.alice)
+        self.users.add(self.john)
+
+    def test_find(self):
+        self.assertIs(self.users.find('U1'), self.alice)
+        self.assertIs(self.users.find('ALICE'), self.alice)
+        self.assertIs(self.users.find('alice jones'), self.alice)
+        self.assertIs(self.users.find('johnny'), self.john)
+        self.assertIsNone(self.users.find('bob'))
+
+    def test_find_prefix(self):
+        self.assertEqual(self.users.find_prefix('j'), [self.john])
+        self.assertEqual(self.users.find_prefix('A'), [self.alice])
+        self.assertEqual(self.users.find_prefix(''), [self.alice, self.john])
+        self.assertEqual(self.users.find_prefix('', limit=1), [self.alice])
+
+    def test_remove(self):
+        del self.users['U1']
+
+        self.assertNotIn('U1', self.users)
+        self.assertIsNone(self.users.find('alice'))
+        self.assertIsNone(self.users.find('alice jones'))
+        self.assertEqual(self.users.names(), ['john'])
+
+    def test_readding_an_object_reindexes_it(self):
+        self.alice._update(name='alicia')
+        self.users.add(self.alice)
+
+        self.assertIsNone(self.users.find('alice'))
+        self.assertIs(self.users.find('alicia'), self.alice)
+        self.assertEqual(self.users.names(), ['alicia', 'john'])
+        self.assertEqual(len(self.users), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
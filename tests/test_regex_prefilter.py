@@ -0,0 +1,120 @@
+import re
+import unittest
+from jeev.utils.regex_prefilter import RegexPrefilter, RegexMatcher, required_literal
+
+
+class CountingRegex(object):
+    """
+        Wraps a compiled regex, counting how many times it's searched. Unlike `re.compile`, which caches its results,
+        two CountingRegexes with the same pattern are distinct objects, like the regexes of two different modules can
+        be.
+    """
+
+    def __init__(self, pattern, flags=0):
+        self._regex = re.compile(pattern, flags)
+        self.pattern = pattern
+        self.flags = self._regex.flags
+        self.searches = 0
+
+    def search(self, text):
+        self.searches += 1
+        return self._regex.search(text)
+
+
+class RequiredLiteralTest(unittest.TestCase):
+    def assert_literal(self, pattern, literal, flags=0):
+        self.assertEqual(required_literal(re.compile(pattern, flags)), literal)
+
+    def test_longest_literal_run(self):
+        self.assert_literal(r'countdown for (\d+) seconds', 'countdown for ')
+        self.assert_literal(r'(foo|bar) baz', ' baz')
+        self.assert_literal(r'^hello\s+worlds$', 'worlds')
+
+    def test_literals_inside_groups_are_adjacent(self):
+        self.assert_literal(r'(?P<a>foo)(bar)', 'foobar')
+
+    def test_anchors_do_not_split_literals(self):
+        self.assert_literal(r'^ping', 'ping')
+        self.assert_literal(r'foo\bbar', 'foobar')
+
+    def test_literal_is_lowercased(self):
+        self.assert_literal(r'Hello', 'hello')
+        self.assert_literal(r'Hello', 'hello', re.I)
+
+    def test_no_literal(self):
+        self.assert_literal(r'foo|bar', None)
+        self.assert_literal(r'\d+', None)
+        self.assert_literal(r'ab', None)
+        self.assert_literal(r'a?bc', None)
+
+
+class RegexMatcherTest(unittest.TestCase):
+    def test_regexes_without_their_literal_are_skipped(self):
+        regex = CountingRegex(r'countdown for (\d+) seconds')
+        prefilter = RegexPrefilter([regex])
+
+        self.assertIsNone(prefilter.matcher('hello there').search(regex))
+        self.assertEqual(regex.searches, 0)
+
+        match = prefilter.matcher('start a countdown for 10 seconds').search(regex)
+        self.assertEqual(match.group(1), '10')
+        self.assertEqual(regex.searches, 1)
+
+    def test_literal_is_not_enough_to_match(self):
+        regex = CountingRegex(r'countdown for (\d+) seconds')
+        prefilter = RegexPrefilter([regex])
+
+        self.assertIsNone(prefilter.matcher('countdown for ten seconds').search(regex))
+        self.assertEqual(regex.searches, 1)
+
+    def test_prefilter_is_case_insensitive(self):
+        regex = CountingRegex(r'hello world', re.I)
+        prefilter = RegexPrefilter([regex])
+
+        self.assertIsNotNone(prefilter.matcher('HELLO WORLD').search(regex))
+
+    def test_identical_regexes_are_searched_once_per_message(self):
+        first = CountingRegex(r'ping (\w+)')
+        second = CountingRegex(r'ping (\w+)')
+        other_flags = CountingRegex(r'ping (\w+)', re.I)
+        prefilter = RegexPrefilter([first, second, other_flags])
+
+        matcher = prefilter.matcher('ping pong')
+        self.assertEqual(matcher.search(first).group(1), 'pong')
+        self.assertEqual(matcher.search(second).group(1), 'pong')
+        self.assertEqual(matcher.search(first).group(1), 'pong')
+        self.assertEqual(first.searches + second.searches, 1)
+
+        # A different set of flags is a different regex.
+        matcher.search(other_flags)
+        self.assertEqual(other_flags.searches, 1)
+
+        # Results are only memoized for a single message.
+        prefilter.matcher('ping again').search(second)
+        self.assertEqual(first.searches + second.searches, 2)
+
+    def test_failed_searches_are_memoized(self):
+        regex = CountingRegex(r'ping (\d+)')
+        matcher = RegexPrefilter([regex]).matcher('ping pong')
+
+        self.assertIsNone(matcher.search(regex))
+        self.assertIsNone(matcher.search(regex))
+        self.assertEqual(regex.searches, 1)
+
+    def test_matcher_without_prefilter(self):
+        regex = CountingRegex(r'countdown for (\d+) seconds')
+        matcher = RegexMatcher('hello there')
+
+        self.assertIsNone(matcher.search(regex))
+        self.assertIsNone(matcher.search(regex))
+        self.assertEqual(regex.searches, 1)
+
+    def test_unknown_regexes_are_searched(self):
+        regex = CountingRegex(r'countdown for (\d+) seconds')
+        matcher = RegexPrefilter().matcher('countdown for 3 seconds')
+
+        self.assertEqual(matcher.search(regex).group(1), '3')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+import gevent
+from jeev.utils.scheduler import RateLimitedScheduler, TokenBucket
+
+
+class TokenBucketTest(unittest.TestCase):
+    def test_bursts_then_rate(self):
+        bucket = TokenBucket(2, 3)
+        now = bucket.updated_at
+
+        self.assertEqual([bucket.consume(now) for _ in xrange(4)], [True, True, True, False])
+        self.assertAlmostEqual(bucket.wait_time(now), 0.5)
+        self.assertFalse(bucket.full(now))
+
+        self.assertTrue(bucket.consume(now + 0.5))
+        self.assertFalse(bucket.consume(now + 0.5))
+        self.assertTrue(bucket.full(now + 10))
+        self.assertEqual(bucket.wait_time(now + 10), 0)
+
+
+class RateLimitedSchedulerTest(unittest.TestCase):
+    def make_scheduler(self, rate=1.0, burst=3, fail_on=()):
+        self.sent = []
+        self.delays = []
+
+        def send(item):
+            if item in fail_on:
+                raise ValueError(item)
+
+            self.sent.append(item)
+
+        scheduler = RateLimitedScheduler(send, rate, burst, on_sent=self.delays.append)
+        scheduler.start()
+        self.addCleanup(scheduler.stop)
+        return scheduler
+
+    def test_rate_limit(self):
+        scheduler = self.make_scheduler(rate=20, burst=2)
+        for i in xrange(4):
+            scheduler.schedule('C1', i)
+
+        # The burst is sent right away, the rest at the key's rate.
+        gevent.sleep(0.01)
+        self.assertEqual(self.sent, [0, 1])
+        self.assertEqual(scheduler.queue_depth, 2)
+
+        gevent.sleep(0.15)
+        self.assertEqual(self.sent, [0, 1, 2, 3])
+        self.assertEqual(scheduler.queue_depth, 0)
+        self.assertEqual(len(self.delays), 4)
+        self.assertTrue(self.delays[3] >= 0.05)
+
+    def test_keys_are_rate_limited_separately_and_round_robin(self):
+        scheduler = self.make_scheduler(rate=1, burst=2)
+        for i in xrange(3):
+            scheduler.schedule('C1', 'a%d' % i)
+        for i in xrange(2):
+            scheduler.schedule('C2', 'b%d' % i)
+
+        gevent.sleep(0.01)
+        self.assertEqual(self.sent, ['a0', 'b0', 'a1', 'b1'])
+        self.assertEqual(list(scheduler.iter_items()), ['a2'])
+
+    def test_priority_items_are_sent_first(self):
+        scheduler = self.make_scheduler(rate=1, burst=1)
+        scheduler.pause()
+        scheduler.schedule('C1', 'normal')
+        scheduler.schedule('C1', 'priority', priority=True)
+        scheduler.resume()
+
+        gevent.sleep(0.01)
+        self.assertEqual(self.sent, ['priority'])
+
+    def test_pause_and_resume(self):
+        scheduler = self.make_scheduler()
+        scheduler.pause()
+        scheduler.schedule('C1', 'a')
+        scheduler.schedule('C2', 'b', priority=True)
+
+        gevent.sleep(0.01)
+        self.assertEqual(self.sent, [])
+        self.assertEqual(sorted(scheduler.iter_items()), ['a', 'b'])
+        self.assertEqual(scheduler.queue_depth, 2)
+
+        scheduler.resume()
+        gevent.sleep(0.01)
+        self.assertEqual(sorted(self.sent), ['a', 'b'])
+        self.assertEqual(list(scheduler.iter_items()), [])
+
+    def test_send_errors_do_not_stop_the_scheduler(self):
+        scheduler = self.make_scheduler(fail_on=['bad'])
+        scheduler.schedule('C1', 'bad')
+        scheduler.schedule('C1', 'good')
+
+        gevent.sleep(0.01)
+        self.assertEqual(self.sent, ['good'])
+        self.assertEqual(len(self.delays), 2)
+
+    def test_idle_keys_are_forgotten_once_their_bucket_is_full(self):
+        scheduler = self.make_scheduler(rate=1000, burst=1)
+        scheduler.schedule('C1', 'a')
+        gevent.sleep(0.01)
+        self.assertEqual(self.sent, ['a'])
+
+        # Waking the scheduler up with nothing to send lets it forget the key.
+        scheduler._wakeup.set()
+        gevent.sleep(0.01)
+        self.assertNotIn('C1', scheduler._queues)
+
+
+if __name__ == '__main__':
+    unittest.main()
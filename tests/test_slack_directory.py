@@ -0,0 +1,147 @@
+import unittest
+from jeev import events
+from jeev.adapter.slack import SlackAdapter
+from tests.utils import FakeJeev
+
+
+def login_data(users=(), channels=(), groups=(), ims=()):
+    return {'users': list(users), 'channels': list(channels), 'groups': list(groups), 'ims': list(ims)}
+
+
+def user(id, name, **kwargs):
+    return dict(kwargs, id=id, name=name)
+
+
+def channel(id, name, members=(), **kwargs):
+    return dict(kwargs, id=id, name=name, is_channel=True, is_member=True, members=list(members))
+
+
+class ReconcileTest(unittest.TestCase):
+    def setUp(self):
+        self.adapter = SlackAdapter(FakeJeev(), {'slack_token': 'token'})
+        self.addCleanup(self.adapter._transport.close)
+        self.events = []
+        self.adapter._broadcast_event = lambda event, **kwargs: self.events.append((event, kwargs))
+
+        self.adapter._parse_login_data(login_data(
+            users=[user('U1', 'alice', presence='active'), user('U2', 'bob')],
+            channels=[channel('C1', 'general', ['U1', 'U2']), channel('C2', 'random', ['U2'])],
+        ))
+        self.adapter._directory_loaded = True
+        self.alice = self.adapter._users['U1']
+        self.bob = self.adapter._users['U2']
+        self.general = self.adapter._channels['C1']
+        self.random = self.adapter._channels['C2']
+
+    def reconcile(self, **kwargs):
+        del self.events[:]
+        self.adapter._parse_login_data(login_data(**kwargs))
+        return [(e.class_name, e.attribute_name) for e, _ in self.events]
+
+    def test_first_load_does_not_broadcast(self):
+        self.assertEqual(self.events, [])
+        self.assertEqual(self.adapter.user_channels('U2'), {self.general, self.random})
+
+    def test_unchanged_directory(self):
+        broadcast = self.reconcile(
+            users=[user('U1', 'alice', presence='active'), user('U2', 'bob')],
+            channels=[channel('C1', 'general', ['U1', 'U2']), channel('C2', 'random', ['U2'])],
+        )
+        self.assertEqual(broadcast, [])
+        self.assertIs(self.adapter._users['U1'], self.alice)
+        self.assertIs(self.adapter._channels['C1'], self.general)
+
+    def test_changed_objects_are_updated_in_place(self):
+        broadcast = self.reconcile(
+            users=[user('U1', 'alicia', presence='away'), user('U2', 'bob')],
+            channels=[channel('C1', 'lobby', ['U1', 'U2'], is_archived=True), channel('C2', 'random', ['U2'])],
+        )
+        self.assertEqual(sorted(broadcast), [
+            ('Channel', 'Archived'),
+            ('Channel', 'Renamed'),
+            ('User', 'Changed'),
+            ('User', 'PresenceChanged'),
+        ])
+
+        self.assertIs(self.adapter._users['U1'], self.alice)
+        self.assertEqual((self.alice.name, self.alice.presence), ('alicia', 'away'))
+        # Renamed objects are re-indexed under their new name.
+        self.assertIs(self.adapter._users.find('alicia'), self.alice)
+        self.assertIsNone(self.adapter._users.find('alice'))
+        self.assertIs(self.adapter._channels.find('lobby'), self.general)
+
+    def test_presence_only_change(self):
+        broadcast = self.reconcile(
+            users=[user('U1', 'alice', presence='away'), user('U2', 'bob')],
+            channels=[channel('C1', 'general', ['U1', 'U2']), channel('C2', 'random', ['U2'])],
+        )
+        self.assertEqual(broadcast, [('User', 'PresenceChanged')])
+
+    def test_added_objects(self):
+        broadcast = self.reconcile(
+            users=[user('U1', 'alice', presence='active'), user('U2', 'bob'), user('U3', 'carol')],
+            channels=[channel('C1', 'general', ['U1', 'U2', 'U3']), channel('C2', 'random', ['U2']),
+                      channel('C3', 'new', ['U3'])],
+        )
+        self.assertEqual(broadcast, [
+            ('Team', 'Joined'),
+            ('Channel', 'Created'),
+            ('Channel', 'Joined'),
+            ('Channel', 'UserJoined'),
+        ])
+
+        carol = self.adapter._users['U3']
+        self.assertIs(self.events[-1][1]['user'], carol)
+        self.assertEqual(self.adapter.user_channels(carol), {self.general, self.adapter._channels['C3']})
+
+    def test_removed_objects(self):
+        broadcast = self.reconcile(
+            users=[user('U2', 'bob')],
+            channels=[channel('C2', 'random', ['U2'])],
+        )
+        self.assertEqual(broadcast, [('Channel', 'Deleted')])
+        self.assertIs(self.events[0][1]['channel'], self.general)
+
+        self.assertNotIn('U1', self.adapter._users)
+        self.assertIsNone(self.adapter._users.find('alice'))
+        self.assertNotIn('C1', self.adapter._channels)
+        # The removed channel no longer counts towards its members' channels, and the removed user has none.
+        self.assertEqual(self.adapter.user_channels('U2'), {self.random})
+        self.assertEqual(self.adapter.user_channels('U1'), set())
+        self.assertNotIn('U1', self.adapter._channels_by_user)
+
+    def test_member_changes(self):
+        broadcast = self.reconcile(
+            users=[user('U1', 'alice', presence='active'), user('U2', 'bob')],
+            channels=[channel('C1', 'general', ['U1']), channel('C2', 'random', ['U1', 'U2'])],
+        )
+        self.assertEqual(sorted(broadcast), [('Channel', 'UserJoined'), ('Channel', 'UserLeft')])
+        joined = [kwargs for e, kwargs in self.events if e is events.Channel.UserJoined][0]
+        left = [kwargs for e, kwargs in self.events if e is events.Channel.UserLeft][0]
+        self.assertEqual((joined['channel'], joined['user']), (self.random, self.alice))
+        self.assertEqual((left['channel'], left['user']), (self.general, self.bob))
+
+        self.assertEqual(self.general.members, (self.alice,))
+        self.assertEqual(self.adapter.user_channels(self.alice), {self.general, self.random})
+        self.assertEqual(self.adapter.user_channels(self.bob), {self.random})
+
+
+class MergeObjectTest(unittest.TestCase):
+    def setUp(self):
+        self.adapter = SlackAdapter(FakeJeev(), {'slack_token': 'token'})
+        self.addCleanup(self.adapter._transport.close)
+
+    def test_merge_updates_the_existing_object(self):
+        users = self.adapter._users
+        alice = self.adapter._merge_object(users, SlackAdapter.SlackUser, user('U1', 'alice'))
+        merged = self.adapter._merge_object(users, SlackAdapter.SlackUser, user('U1', 'alicia', presence='away'))
+
+        self.assertIs(merged, alice)
+        self.assertEqual(alice.presence, 'away')
+        self.assertIs(users.find('alicia'), alice)
+        self.assertIsNone(users.find('alice'))
+        self.assertEqual(len(users), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
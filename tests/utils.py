@@ -0,0 +1,46 @@
+from jeev.message import Message
+from jeev.metrics import Metrics
+from jeev.module import Module, Modules
+
+
+class FakeJeev(object):
+    """
+        Just enough of Jeev to load modules and dispatch messages and events to them, without an adapter, storage or
+        web server.
+    """
+
+    def __init__(self):
+        self._opts = {}
+        self.metrics = Metrics(self)
+        self.modules = Modules(self)
+        self.errors = []
+        self.sent = []
+
+    def on_module_error(self, module, e):
+        self.errors.append((module.name, e))
+
+    def send_message(self, channel, message, priority=False):
+        self.sent.append((channel, message))
+
+    def _handle_event(self, event, **kwargs):
+        self.modules._handle_event(event, kwargs)
+
+
+def add_module(jeev, name):
+    """
+        Adds an empty module to jeev, the way `Modules.load` does, minus importing the module's file. Handlers are
+        registered with the module's decorators, like a module file would.
+    """
+    modules = jeev.modules
+    module = Module(name, {})
+    module._register(modules)
+    modules._module_list.append(module)
+    modules._module_dict[name] = module
+    modules._rebuild_dispatch_index()
+    return module
+
+
+def make_message(jeev, text, channel='C1', user='U1'):
+    message = Message({}, channel, user, text)
+    message._jeev = jeev
+    return message